@@ -2,10 +2,11 @@
 
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey, Boolean, LargeBinary, Index
+from sqlalchemy import Engine, create_engine, event, Column, Integer, String, DateTime, Text, ForeignKey, Boolean, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy.dialects.postgresql import JSONB
@@ -104,6 +105,7 @@ class RouteSnapshot(Base):
     timestamp = Column(DateTime, nullable=False, index=True)
     data = Column(JSONB, nullable=False)
     route_count = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of canonical JSON data
     
     device = relationship("Device", back_populates="snapshots")
     
@@ -133,6 +135,7 @@ class BGPSnapshot(Base):
     timestamp = Column(DateTime, nullable=False, index=True)
     data = Column(JSONB, nullable=False)
     route_count = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of canonical JSON data
     
     device = relationship("Device", back_populates="bgp_snapshots")
     
@@ -177,10 +180,25 @@ class RouteDiff(Base):
             "timestamp": self.timestamp.isoformat(),
             "added": self.added,
             "removed": self.removed,
-            "changed": self.changed,
+            "changed": normalize_changed(self.changed),
         }
 
 
+def normalize_changed(changed: Optional[List[Any]]) -> List[Any]:
+    """
+    RouteDiff.changed entries as {"key", "previous", "current"}. Rows written
+    before that format hold the current route with the previous one under
+    "_previous"; those are converted (key taken from the route's prefix).
+    """
+    out = []
+    for entry in changed or []:
+        if isinstance(entry, dict) and "_previous" in entry:
+            current = {k: v for k, v in entry.items() if k != "_previous"}
+            entry = {"key": current.get("prefix"), "previous": entry["_previous"], "current": current}
+        out.append(entry)
+    return out
+
+
 def get_db_url() -> str:
     """Get database URL from environment or use default."""
     return os.getenv(
@@ -189,16 +207,83 @@ def get_db_url() -> str:
     )
 
 
+# Size of SQLAlchemy's compiled-statement cache; storage_db keeps its hot
+# queries as module-level statements so they stay resident in this cache.
+QUERY_CACHE_SIZE = 1200
+
+# Connection pool sizing for the shared engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+# Applied to every SQLite connection: WAL lets the web UI read while the poller
+# writes, and busy_timeout makes a writer wait on a lock instead of failing.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def get_engine() -> Engine:
+    """Get the process-wide engine for the configured database URL.
+    
+    The engine (and its connection pool) is created once and shared by every
+    session, so short-lived DeviceManager/DatabaseStorage instances reuse
+    pooled connections instead of each opening their own.
+    """
+    url = get_db_url()
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            kwargs = {
+                "query_cache_size": QUERY_CACHE_SIZE,
+                "pool_pre_ping": True,
+                "pool_recycle": DB_POOL_RECYCLE,
+            }
+            if not url.startswith("sqlite"):
+                kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+            engine = create_engine(url, **kwargs)
+            if url.startswith("sqlite"):
+                event.listen(engine, "connect", _sqlite_pragmas)
+            Base.metadata.create_all(engine)
+            _engines[url] = engine
+    return engine
+
+
+_session_factories: Dict[Engine, sessionmaker] = {}
+
+
 def get_session() -> Session:
     """Get database session."""
-    engine = create_engine(get_db_url())
-    Base.metadata.create_all(engine)
-    SessionLocal = sessionmaker(bind=engine)
+    engine = get_engine()
+    SessionLocal = _session_factories.get(engine)
+    if SessionLocal is None:
+        SessionLocal = _session_factories.setdefault(engine, sessionmaker(bind=engine))
     return SessionLocal()
 
 
 def init_db():
     """Initialize database tables."""
-    engine = create_engine(get_db_url())
+    engine = get_engine()
     Base.metadata.create_all(engine)
-    print(f"Database initialized at {get_db_url()}")
\ No newline at end of file
+    print(f"Database initialized at {get_db_url()}")
@@ -2,12 +2,25 @@
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+from sqlalchemy import Row, func, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from database import Device, get_session
 
 
+# Columns shown by device listings; selecting just these skips building ORM
+# objects (and the encrypted password / VRF list) for every device.
+_Q_DEVICE_SUMMARIES = select(
+    Device.id, Device.name, Device.hostname, Device.device_type, Device.username,
+    Device.port, Device.enabled, Device.use_nxapi, Device.created_at, Device.updated_at,
+)
+_Q_ENABLED_DEVICE_SUMMARIES = _Q_DEVICE_SUMMARIES.where(Device.enabled == True)
+
+_Q_DEVICE_COUNT = select(func.count()).select_from(Device)
+_Q_ENABLED_DEVICE_COUNT = _Q_DEVICE_COUNT.where(Device.enabled == True)
+
+
 class DeviceManager:
     """Manage network devices in database."""
     
@@ -62,6 +75,16 @@ class DeviceManager:
             query = query.filter_by(enabled=True)
         return query.all()
     
+    def get_device_summaries(self, enabled_only: bool = True) -> List[Row]:
+        """Listing columns of all devices, as rows rather than Device objects."""
+        stmt = _Q_ENABLED_DEVICE_SUMMARIES if enabled_only else _Q_DEVICE_SUMMARIES
+        return list(self.session.execute(stmt))
+    
+    def count_devices(self, enabled_only: bool = True) -> int:
+        """Number of devices, counted in the database."""
+        stmt = _Q_ENABLED_DEVICE_COUNT if enabled_only else _Q_DEVICE_COUNT
+        return self.session.execute(stmt).scalar_one()
+    
     def add_device(
         self,
         name: str,
@@ -156,7 +179,7 @@ class DeviceManager:
     
     def export_devices(self, enabled_only: bool = True) -> List[Dict[str, Any]]:
         """Export devices as list of dicts (without passwords)."""
-        devices = self.get_all_devices(enabled_only=enabled_only)
+        devices = self.get_device_summaries(enabled_only=enabled_only)
         return [
             {
                 "id": d.id,
@@ -5,7 +5,8 @@ Table diffing with ECMP set comparison, attr deltas, and simple flap debounce.
 
 from typing import List, Dict, Tuple, Any
 from collections import defaultdict
-from models import RIBEntry, BGPEntry
+from operator import attrgetter
+from models import RIBEntry, BGPEntry, serialize_nexthops
 
 def index_by_key(rows, key_fn):
     d = defaultdict(list)
@@ -13,6 +14,26 @@ def index_by_key(rows, key_fn):
         d[key_fn(r)].append(r)
     return d
 
+def collapse_rib(rows: List[RIBEntry]):
+    """
+    Collapse the ECMP rows sharing a key into (sample, nexthops, distance, metric, best).
+    """
+    if len(rows) == 1:
+        r = rows[0]
+        return r, r.nexthops, r.distance, r.metric, r.best
+    nh = set()
+    best = False
+    dist = None
+    metric = None
+    sample = None
+    for r in rows:
+        nh |= r.nexthops
+        best = best or r.best
+        dist = r.distance if r.distance is not None else dist
+        metric = r.metric if r.metric is not None else metric
+        sample = r
+    return sample, nh, dist, metric, best
+
 def rib_diff(prev: List[RIBEntry], curr: List[RIBEntry]) -> Dict[str, Any]:
     """
     Compare per-key, diff nexthops set, distance, metric, best.
@@ -23,43 +44,20 @@ def rib_diff(prev: List[RIBEntry], curr: List[RIBEntry]) -> Dict[str, Any]:
 
     adds, rems, chgs = [], [], []
 
-    prev_keys = set(prev_i.keys())
-    curr_keys = set(curr_i.keys())
-
-    for k in curr_keys - prev_keys:
-        for e in curr_i[k]:
-            adds.append(e.serialize())
-
-    for k in prev_keys - curr_keys:
-        for e in prev_i[k]:
-            rems.append(e.serialize())
-
-    for k in prev_keys & curr_keys:
-        # collapse ECMP sets by key
-        def collapse(rows: List[RIBEntry]):
-            nh = set()
-            best = False
-            dist = None
-            metric = None
-            proto = None
-            sample = None
-            for r in rows:
-                nh |= set(r.nexthops)
-                best = best or r.best
-                dist = r.distance if r.distance is not None else dist
-                metric = r.metric if r.metric is not None else metric
-                proto = r.protocol or proto
-                sample = r
-            return sample, nh, dist, metric, best
-
-        a_s, a_nh, a_dist, a_met, a_best = collapse(prev_i[k])
-        b_s, b_nh, b_dist, b_met, b_best = collapse(curr_i[k])
+    # One pass over the current index covers both additions and changes
+    for k, b_rows in curr_i.items():
+        a_rows = prev_i.get(k)
+        if a_rows is None:
+            adds.extend(e.serialize() for e in b_rows)
+            continue
+        if a_rows == b_rows:
+            continue  # unchanged rows (list equality short-circuits on identity)
+
+        a_s, a_nh, a_dist, a_met, a_best = collapse_rib(a_rows)
+        b_s, b_nh, b_dist, b_met, b_best = collapse_rib(b_rows)
 
         delta = {}
-        if a_nh != b_nh: delta["nexthops"] = (
-            sorted([{"nh": x.nh, "iface": x.iface} for x in a_nh], key=lambda v: (v["nh"], v["iface"] or "")),
-            sorted([{"nh": x.nh, "iface": x.iface} for x in b_nh], key=lambda v: (v["nh"], v["iface"] or "")),
-        )
+        if a_nh != b_nh: delta["nexthops"] = (serialize_nexthops(a_nh), serialize_nexthops(b_nh))
         if a_dist != b_dist: delta["distance"] = (a_dist, b_dist)
         if a_met != b_met: delta["metric"] = (a_met, b_met)
         if a_best != b_best: delta["best"] = (a_best, b_best)
@@ -69,8 +67,26 @@ def rib_diff(prev: List[RIBEntry], curr: List[RIBEntry]) -> Dict[str, Any]:
             base["delta"] = delta
             chgs.append(base)
 
+    for k in prev_i.keys() - curr_i.keys():
+        rems.extend(e.serialize() for e in prev_i[k])
+
     return {"adds": adds, "rems": rems, "chgs": chgs}
 
+BGP_DIFF_ATTRS = ("best", "nh", "as_path", "local_pref", "med", "origin", "communities_hash", "peer")
+_bgp_attrs = attrgetter(*BGP_DIFF_ATTRS)
+
+def pick_best(rows: List[BGPEntry]) -> BGPEntry:
+    for r in rows:
+        if r.best:
+            return r
+    return rows[0]  # fallback
+
+def head_as(as_path: str) -> str:
+    for p in as_path.split():
+        if p.isdigit():
+            return p
+    return ""
+
 def bgp_diff(prev: List[BGPEntry], curr: List[BGPEntry]) -> Dict[str, Any]:
     """
     Compare per-prefix key; detect attr changes.
@@ -80,47 +96,38 @@ def bgp_diff(prev: List[BGPEntry], curr: List[BGPEntry]) -> Dict[str, Any]:
 
     adds, rems, chgs = [], [], []
 
-    prev_keys = set(prev_i.keys())
-    curr_keys = set(curr_i.keys())
-
-    for k in curr_keys - prev_keys:
-        for e in curr_i[k]:
-            adds.append(e.serialize())
-
-    for k in prev_keys - curr_keys:
-        for e in prev_i[k]:
-            rems.append(e.serialize())
+    # One pass over the current index covers both additions and changes
+    for k, b_rows in curr_i.items():
+        a_rows = prev_i.get(k)
+        if a_rows is None:
+            adds.extend(e.serialize() for e in b_rows)
+            continue
 
-    for k in prev_keys & curr_keys:
         # Compare "bestpath" and attrs of (the) bestpath entry, but also watch as_path/localpref/med even if not best.
-        def pick_best(rows: List[BGPEntry]) -> BGPEntry:
-            for r in rows:
-                if r.best:
-                    return r
-            return rows[0]  # fallback
+        a_best = pick_best(a_rows)
+        b_best = pick_best(b_rows)
 
-        a_best = pick_best(prev_i[k])
-        b_best = pick_best(curr_i[k])
+        a_vals = _bgp_attrs(a_best)
+        b_vals = _bgp_attrs(b_best)
+        if a_vals == b_vals:
+            continue
 
-        attrs = ["best", "nh", "as_path", "local_pref", "med", "origin", "communities_hash", "peer"]
         delta = {}
-        for attr in attrs:
-            av = getattr(a_best, attr)
-            bv = getattr(b_best, attr)
+        for attr, av, bv in zip(BGP_DIFF_ATTRS, a_vals, b_vals):
             if av != bv:
                 delta[attr] = (av, bv)
 
         # If upstream ASN (leftmost) changed, this is a strong signal
-        def head_as(as_path: str) -> str:
-            parts = [p for p in as_path.split() if p.isdigit()]
-            return parts[0] if parts else ""
+        if "as_path" in delta:
+            a_head, b_head = head_as(a_best.as_path), head_as(b_best.as_path)
+            if a_head != b_head:
+                delta["upstream_as"] = (a_head, b_head)
 
-        if head_as(a_best.as_path) != head_as(b_best.as_path):
-            delta["upstream_as"] = (head_as(a_best.as_path), head_as(b_best.as_path))
+        base = b_best.serialize()
+        base["delta"] = delta
+        chgs.append(base)
 
-        if delta:
-            base = b_best.serialize()
-            base["delta"] = delta
-            chgs.append(base)
+    for k in prev_i.keys() - curr_i.keys():
+        rems.extend(e.serialize() for e in prev_i[k])
 
-    return {"adds": adds, "rems": rems, "chgs": chgs}
\ No newline at end of file
+    return {"adds": adds, "rems": rems, "chgs": chgs}
@@ -86,7 +86,7 @@ def export_metrics():
                         ).set(timestamps[0].timestamp())
                 
                 # Get recent diffs for change metrics
-                diffs = storage.get_diffs(device.name, vrf, afi, table_type, limit=10)
+                diffs = storage.get_diff_summaries(device.name, vrf, afi, table_type, limit=10)
                 
                 for diff in diffs:
                     # Count changes in this diff
@@ -97,7 +97,7 @@ def export_metrics():
                             afi=afi,
                             table=table_type,
                             change_type='added'
-                        )._value._value = len(diff['added'])
+                        )._value._value = diff['added']
                     
                     if diff.get('removed'):
                         route_changes.labels(
@@ -106,7 +106,7 @@ def export_metrics():
                             afi=afi,
                             table=table_type,
                             change_type='removed'
-                        )._value._value = len(diff['removed'])
+                        )._value._value = diff['removed']
                     
                     if diff.get('changed'):
                         route_changes.labels(
@@ -115,7 +115,7 @@ def export_metrics():
                             afi=afi,
                             table=table_type,
                             change_type='changed'
-                        )._value._value = len(diff['changed'])
+                        )._value._value = diff['changed']
     
     finally:
         storage.close()
@@ -7,15 +7,30 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Tuple, Optional, Set
 import hashlib
 import json
+import sys
 
 AFI4 = "ipv4"
 AFI6 = "ipv6"
 
-@dataclass(frozen=True)
+# Communities kept per BGP path (communities_hash always covers the full set)
+MAX_COMMUNITIES = 64
+
+@dataclass(frozen=True, slots=True)
 class NH:
     nh: str
     iface: Optional[str]
 
+def _nh_sort_key(n: NH) -> Tuple[str, str]:
+    return (n.nh, n.iface or "")
+
+def serialize_nexthops(nexthops) -> List[Dict]:
+    """
+    Serialize an ECMP next-hop set in a stable (nh, iface) order.
+    """
+    if len(nexthops) > 1:
+        nexthops = sorted(nexthops, key=_nh_sort_key)
+    return [{"nh": n.nh, "iface": n.iface} for n in nexthops]
+
 def normalize_communities(comms) -> List[str]:
     """
     Normalize BGP communities to a sorted list of strings.
@@ -24,28 +39,27 @@ def normalize_communities(comms) -> List[str]:
     if not comms:
         return []
     if isinstance(comms, str):
-        items = [c.strip() for c in comms.split() if c.strip()]
+        items = set(comms.split())
     elif isinstance(comms, list):
-        items = []
+        items = set()
         for c in comms:
-            if c is None:
-                continue
-            items.extend(str(c).split())
+            # split() on any whitespace: an element may still hold several communities
+            if c is not None:
+                items.update(str(c).split())
     else:
-        items = [str(comms)]
-    return sorted(set(items))
+        items = {str(comms)}
+    # Interned: the same few communities repeat across most paths of a table
+    return sorted(map(sys.intern, items))
 
 def set_hash(values: List[str]) -> str:
     """
     Return a stable hash for potentially large lists (e.g., communities).
     """
-    m = hashlib.sha256()
-    for v in values:
-        m.update(v.encode())
-        m.update(b"\x00")
-    return m.hexdigest()
+    # Same bytes as hashing each value followed by a NUL, in one update call
+    data = "\x00".join(values) + "\x00" if values else ""
+    return hashlib.sha256(data.encode()).hexdigest()
 
-@dataclass
+@dataclass(slots=True)
 class RIBEntry:
     device: str
     vrf: str
@@ -70,10 +84,10 @@ class RIBEntry:
             "distance": self.distance,
             "metric": self.metric,
             "best": self.best,
-            "nexthops": sorted([{"nh": n.nh, "iface": n.iface} for n in self.nexthops], key=lambda x: (x["nh"], x["iface"] or "")),
+            "nexthops": serialize_nexthops(self.nexthops),
         }
 
-@dataclass
+@dataclass(slots=True)
 class BGPEntry:
     device: str
     vrf: str
@@ -92,6 +106,11 @@ class BGPEntry:
     originator_id: Optional[str] = None
     cluster_list: Optional[List[str]] = None
 
+    def __post_init__(self):
+        # Truncate once at construction (for readability) instead of on every serialize
+        if len(self.communities) > MAX_COMMUNITIES:
+            self.communities = self.communities[:MAX_COMMUNITIES]
+
     def key(self) -> Tuple[str, str, str]:
         # Path-ID can be added here if your platform exposes it consistently.
         return (self.vrf, self.afi, self.prefix)
@@ -108,7 +127,7 @@ class BGPEntry:
             "local_pref": self.local_pref,
             "med": self.med,
             "origin": self.origin,
-            "communities": self.communities[:64],  # truncate for readability
+            "communities": self.communities,
             "communities_hash": self.communities_hash,
             "weight": self.weight,
             "peer": self.peer,
@@ -9,23 +9,83 @@ Notes:
 - For large tables, consider NX-API/JSON RPC or OpenConfig (future work).
 """
 
-from typing import List, Dict, Optional, Set
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Optional, Set, Tuple
 from netmiko import ConnectHandler
 from genie.conf.base import Device as GenieDevice
 from models import RIBEntry, BGPEntry, NH, AFI4, AFI6, normalize_communities, set_hash
+import hashlib
 import os
+import sys
+import threading
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+
+# NX-OS "show bgp" JSON layout, resolved once instead of re-derived per row
+NXOS_BGP_RD_PATH = (("TABLE_safi", "ROW_safi"), ("TABLE_rd", "ROW_rd"))
+NXOS_BGP_AFI_CODES = {
+    AFI4: frozenset({"1", 1, "ipv4 unicast"}),
+    AFI6: frozenset({"2", 2, "ipv6 unicast"}),
+}
+
+def _intern(value):
+    """
+    Intern short, highly repeated strings (protocols, next-hops, interfaces, peers,
+    AS paths) so large tables share one copy of each instead of one per route.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+@lru_cache(maxsize=1 << 16)
+def _nh(nh, iface) -> NH:
+    """
+    Shared NH instance per (next-hop, interface). A table has few distinct next-hops,
+    so ECMP sets reuse prebuilt (immutable) objects instead of allocating one per route.
+    """
+    return NH(nh=_intern(nh), iface=_intern(iface))
+
+def _rows(container: Dict, table: str, row: str) -> List[Dict]:
+    """
+    NX-API TABLE_x/ROW_x lookup: one row comes back as a dict, several as a list.
+    Missing or empty tables yield [].
+    """
+    try:
+        return _table_rows(container[table], row)
+    except (KeyError, TypeError):
+        return []
+
+def _table_rows(table: Dict, row: str) -> List[Dict]:
+    """
+    Like _rows, for a TABLE_x dict that has already been looked up.
+    """
+    try:
+        rows = table[row]
+    except (KeyError, TypeError):
+        return []
+    if isinstance(rows, list):
+        return rows
+    return [rows] if rows else []
+
+def _first_row_along(container: Dict, path: Tuple[Tuple[str, str], ...]) -> Dict:
+    """
+    Follow the first row of each TABLE_x/ROW_x level in path; {} once a level is missing.
+    """
+    node = container
+    for table, row in path:
+        rows = _rows(node, table, row)
+        node = rows[0] if rows else {}
+    return node
 
 def _try_json(conn, cmd: str) -> Optional[Dict]:
     """
     Try 'cmd | json'. If device rejects, return None.
     """
     try:
-        raw = conn.send_command(cmd + " | json")
+        raw = conn.send_command(cmd + " | json").strip()
         # crude check
-        if raw.strip().startswith("{") or raw.strip().startswith("["):
-            import ujson as json
-            return json.loads(raw)
+        if raw.startswith(("{", "[")):
+            return orjson.loads(raw)
     except Exception:
         pass
     return None
@@ -107,10 +167,23 @@ def discover_vrfs(device_config: Dict) -> List[str]:
     
     return vrfs
 
-def _nxapi_request(host: str, username: str, password: str, cmds: List[str]) -> Optional[Dict]:
+# One keep-alive session for NX-API shared by every device and poller thread,
+# so TCP/TLS handshakes are paid once per device rather than once per command
+NXAPI_POOL_SIZE = int(os.environ.get("NXAPI_POOL_SIZE", "8"))
+_NXAPI_SESSION = requests.Session()
+_NXAPI_SESSION.mount("https://", HTTPAdapter(pool_maxsize=NXAPI_POOL_SIZE))
+_NXAPI_SESSION.mount("http://", HTTPAdapter(pool_maxsize=NXAPI_POOL_SIZE))
+# Seconds allowed per show command; a batched request gets this times its command count
+NXAPI_TIMEOUT = float(os.environ.get("NXAPI_TIMEOUT", "8"))
+
+def _nxapi_enabled(device_os: str) -> bool:
+    return device_os == "nxos" and os.environ.get("USE_NXAPI", "false").lower() == "true"
+
+def _nxapi_request_all(host: str, username: str, password: str, cmds: List[str]) -> List[Optional[Dict]]:
     """
-    Use NX-API JSON to run one or more show commands and return the first response.
-    Requires NX-OS: feature nxapi (HTTP/HTTPS enabled, default /ins).
+    Use NX-API JSON to run one or more show commands in a single request.
+    Returns one body per command (None where a command produced nothing), or []
+    if the request failed. Requires NX-OS: feature nxapi (HTTP/HTTPS enabled, default /ins).
     """
     scheme = os.environ.get("NXAPI_SCHEME", "https")
     port = os.environ.get("NXAPI_PORT", "443")
@@ -127,37 +200,80 @@ def _nxapi_request(host: str, username: str, password: str, cmds: List[str]) ->
         }
     }
     try:
-        r = requests.post(url, json=payload, auth=(username, password), timeout=8, verify=verify)
+        r = _NXAPI_SESSION.post(url, json=payload, auth=(username, password),
+                                timeout=NXAPI_TIMEOUT * len(cmds), verify=verify)
         r.raise_for_status()
         data = r.json()
-        # NX-API wraps responses; pick the first
+        # NX-API wraps responses: a list with one output per command, or a bare dict for one
         if isinstance(data, dict) and "ins_api" in data:
             body = data["ins_api"].get("outputs", {}).get("output")
-            if isinstance(body, list) and body:
-                return body[0].get("body")
+            if isinstance(body, list):
+                return [o.get("body") or None for o in body]
             if isinstance(body, dict):
-                return body.get("body") or body
-        return None
+                return [body.get("body") or body]
+        return []
     except Exception:
-        return None
+        return []
+
+def _nxapi_request(host: str, username: str, password: str, cmds: List[str]) -> Optional[Dict]:
+    """
+    Use NX-API JSON to run one or more show commands and return the first response.
+    """
+    bodies = _nxapi_request_all(host, username, password, cmds)
+    return bodies[0] if bodies else None
+
+# Genie parses keyed by (os, cmd, digest of raw output). A stable network returns
+# byte-identical output poll after poll, so the parse can be reused as-is.
+GENIE_CACHE_SIZE = int(os.environ.get("GENIE_CACHE_SIZE", "64"))
+_genie_cache: "OrderedDict[Tuple[str, str, bytes], Dict]" = OrderedDict()
+_genie_cache_lock = threading.Lock()
 
 def _parse_with_genie(device_name: str, device_os: str, cmd: str, raw: str) -> Dict:
     """
     Use Genie parsers without establishing pyATS connection.
+    Results are cached and shared; callers must not mutate them.
     """
+    key = (device_os, cmd, hashlib.blake2b(raw.encode(), digest_size=16).digest())
+    with _genie_cache_lock:
+        parsed = _genie_cache.get(key)
+        if parsed is not None:
+            _genie_cache.move_to_end(key)
+            return parsed
+
     gdev = GenieDevice(name=device_name, os=device_os)
     gdev.custom.setdefault("abstraction", {})["order"] = ["os"]
     gdev.connect = lambda *args, **kwargs: None
-    return gdev.parse(cmd, output=raw)
+    parsed = gdev.parse(cmd, output=raw)
 
-def fetch_parsed(conn, device_name: str, device_os: str, cmd: str, dev: Dict) -> Dict:
+    if GENIE_CACHE_SIZE > 0:
+        with _genie_cache_lock:
+            _genie_cache[key] = parsed
+            if len(_genie_cache) > GENIE_CACHE_SIZE:
+                _genie_cache.popitem(last=False)
+    return parsed
+
+def _nxapi_fetch_all(dev: Dict, cmds: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    Run every show command for a device in one batched NX-API request.
+    Commands the batch returned no output slot for (all of them if the request
+    failed) are left out, so fetch_parsed retries them one by one over NX-API.
+    """
+    bodies = _nxapi_request_all(dev["host"], dev["username"], dev["password"], cmds)
+    return dict(zip(cmds, bodies))
+
+def fetch_parsed(conn, device_name: str, device_os: str, cmd: str, dev: Dict,
+                 prefetched: Optional[Dict[str, Optional[Dict]]] = None) -> Dict:
     """
     Fetch output using JSON if possible; prefer NX-API for NX-OS when enabled;
-    else fallback to Genie parse.
+    else fallback to Genie parse. prefetched holds NX-API results already fetched
+    by _nxapi_fetch_all.
     """
     # NX-OS first: NX-API (optional)
-    if device_os == "nxos" and os.environ.get("USE_NXAPI", "false").lower() == "true":
-        j = _nxapi_request(dev["host"], dev["username"], dev["password"], [cmd])
+    if _nxapi_enabled(device_os):
+        if prefetched is not None and cmd in prefetched:
+            j = prefetched[cmd]
+        else:
+            j = _nxapi_request(dev["host"], dev["username"], dev["password"], [cmd])
         if j:
             return j
     # Next: try ' | json'
@@ -168,195 +284,202 @@ def fetch_parsed(conn, device_name: str, device_os: str, cmd: str, dev: Dict) ->
     raw = conn.send_command(cmd, use_textfsm=False)
     return _parse_with_genie(device_name, device_os, cmd, raw)
 
+def _parse_rib_genie(device_name: str, vrf: str, afi: str, parsed: Dict) -> Dict[Tuple, RIBEntry]:
+    """
+    Genie shape: vrf > <vrf> > address_family > <afi> > routes.
+    """
+    entries: Dict[Tuple, RIBEntry] = {}
+    routes = parsed["vrf"].get(vrf, {}).get("address_family", {}).get(afi, {}).get("routes", {})
+    for pfx, pdata in routes.items():
+        protocol = pdata.get("route_preference", {}).get("protocol", pdata.get("source_protocol", ""))
+        distance = pdata.get("route_preference", {}).get("preference", pdata.get("distance"))
+        metric = pdata.get("metric")
+        best = pdata.get("active", False)
+
+        # next hops
+        nhs = set()
+        nh_map = pdata.get("next_hop", {})
+        # common case
+        for _, r in (nh_map.get("next_hop_list") or {}).items():
+            nhs.add(_nh(r.get("next_hop"), r.get("outgoing_interface")))
+        # fallback shapes: directly embedded NH or interface-only
+        for nh in (nh_map.get("next_hop") or []):
+            if isinstance(nh, str):
+                nhs.add(_nh(nh, None))
+
+        e = RIBEntry(
+            device=device_name, vrf=vrf, afi=afi,
+            prefix=pfx, protocol=_intern(protocol),
+            distance=distance, metric=metric, best=best, nexthops=nhs
+        )
+        entries.setdefault(e.key(), e)
+    return entries
+
+def _parse_rib_nxapi(device_name: str, vrf: str, afi: str, parsed: Dict) -> Dict[Tuple, RIBEntry]:
+    """
+    NX-API/NX-OS shape (common on some releases): TABLE_vrf > TABLE_addrf > TABLE_prefix > TABLE_path.
+    """
+    entries: Dict[Tuple, RIBEntry] = {}
+    for v in _rows(parsed, "TABLE_vrf", "ROW_vrf"):
+        if v.get("vrf-name-out") != vrf:
+            continue
+        # IPv4/IPv6 may present as separate tables
+        for row_af in _rows(v, "TABLE_addrf", "ROW_addrf"):
+            af_n = row_af.get("addrf")
+            if (afi == AFI4 and "ipv4" not in af_n) or (afi == AFI6 and "ipv6" not in af_n):
+                continue
+            for r in _rows(row_af, "TABLE_prefix", "ROW_prefix"):
+                pfx = r.get("ipprefix") or r.get("ip_prefix")
+                if not pfx:
+                    continue
+
+                proto = ""
+                dist = None
+                met = None
+                best = False
+                nhs = set()
+
+                # Extract protocol, preference, metric and next-hops from paths
+                for path in _rows(r, "TABLE_path", "ROW_path"):
+                    if not proto:
+                        proto = path.get("clientname") or ""
+                    pref = path.get("pref")
+                    if pref is not None:
+                        dist = int(pref)
+                    metric = path.get("metric")
+                    if metric is not None:
+                        met = int(metric)
+                    if path.get("ubest") in ("true", True, "1", 1):
+                        best = True
+                    # Get nexthop
+                    nh_ip = path.get("ipnexthop") or path.get("nexthop")
+                    if nh_ip:
+                        nhs.add(_nh(nh_ip, path.get("ifname")))
+                e = RIBEntry(
+                    device=device_name, vrf=vrf, afi=afi, prefix=pfx, protocol=_intern(proto),
+                    distance=dist, metric=met, best=best, nexthops=nhs
+                )
+                entries.setdefault(e.key(), e)
+    return entries
+
+# RIB output shapes, tried in order; each is recognised by its top-level key
+_RIB_SHAPES = (("vrf", _parse_rib_genie), ("TABLE_vrf", _parse_rib_nxapi))
+
 def parse_rib(device_name: str, device_os: str, vrf: str, afi: str, parsed: Dict) -> List[RIBEntry]:
     """
     Normalize RIB into RIBEntry records with ECMP set for next-hops.
     Supports common Genie & JSON shapes.
     """
-    entries: Dict[str, RIBEntry] = {}
-    # Try Genie-style structure first
-    vrfs = parsed.get("vrf") or parsed.get("TABLE_vrf") or {}
-    if "vrf" in parsed:
-        af_container = parsed["vrf"].get(vrf, {}).get("address_family", {})
-        af_key = afi
-        routes = af_container.get(af_key, {}).get("routes", {})
-        for pfx, pdata in routes.items():
-            protocol = pdata.get("route_preference", {}).get("protocol", pdata.get("source_protocol", ""))
-            distance = pdata.get("route_preference", {}).get("preference", pdata.get("distance"))
-            metric = pdata.get("metric")
-            best = pdata.get("active", False)
-
-            # next hops
-            nhs = set()
-            nh_map = pdata.get("next_hop", {})
-            # common case
-            for _, r in (nh_map.get("next_hop_list") or {}).items():
-                nhs.add(NH(nh=r.get("next_hop"), iface=r.get("outgoing_interface")))
-            # fallback shapes: directly embedded NH or interface-only
-            for nh in (nh_map.get("next_hop") or []):
-                if isinstance(nh, str):
-                    nhs.add(NH(nh=nh, iface=None))
-
-            e = RIBEntry(
-                device=device_name, vrf=vrf, afi=afi,
-                prefix=pfx, protocol=protocol,
-                distance=distance, metric=metric, best=best, nexthops=nhs
-            )
-            entries.setdefault(e.key(), e)
-
-    # NX-API/NX-OS alternative JSON shapes (common on some releases)
-    if not entries and "TABLE_vrf" in parsed:
-        table_vrf = parsed.get("TABLE_vrf", {})
-        row_vrf = table_vrf.get("ROW_vrf", [])
-        if not isinstance(row_vrf, list):
-            row_vrf = [row_vrf] if row_vrf else []
-        for v in row_vrf:
-            if v.get("vrf-name-out") != vrf:
-                continue
-            # IPv4/IPv6 may present as separate tables
-            table_af = v.get("TABLE_addrf") or {}
-            row_addrf = table_af.get("ROW_addrf") or []
-            if not isinstance(row_addrf, list):
-                row_addrf = [row_addrf] if row_addrf else []
-            for row_af in row_addrf:
-                af_n = row_af.get("addrf")
-                if (afi == AFI4 and "ipv4" not in af_n) or (afi == AFI6 and "ipv6" not in af_n):
-                    continue
-                routes = row_af.get("TABLE_prefix", {})
-                rows = routes.get("ROW_prefix") or []
-                if isinstance(rows, dict):
-                    rows = [rows]
-                for r in rows:
-                    pfx = r.get("ipprefix") or r.get("ip_prefix")
-                    # Extract protocol from paths
-                    path_table = r.get("TABLE_path", {})
-                    path_rows = path_table.get("ROW_path", [])
-                    if not isinstance(path_rows, list):
-                        path_rows = [path_rows] if path_rows else []
-                    
-                    proto = ""
-                    dist = None
-                    met = None
-                    best = False
-                    nhs = set()
-                    
-                    for path in path_rows:
-                        if not proto and path.get("clientname"):
-                            proto = path.get("clientname")
-                        if path.get("pref") is not None:
-                            dist = int(path.get("pref"))
-                        if path.get("metric") is not None:
-                            met = int(path.get("metric"))
-                        if path.get("ubest") in ("true", True, "1", 1):
-                            best = True
-                        # Get nexthop
-                        nh_ip = path.get("ipnexthop") or path.get("nexthop")
-                        if nh_ip:
-                            nhs.add(NH(nh=nh_ip, iface=path.get("ifname")))
-                    if pfx:
-                        e = RIBEntry(
-                            device=device_name, vrf=vrf, afi=afi, prefix=pfx, protocol=proto,
-                            distance=dist, metric=met, best=best, nexthops=nhs
-                        )
-                        entries.setdefault(e.key(), e)
-    return list(entries.values())
+    for marker, parse in _RIB_SHAPES:
+        if marker in parsed:
+            entries = parse(device_name, vrf, afi, parsed)
+            if entries:
+                return list(entries.values())
+    return []
 
-def parse_bgp(device_name: str, device_os: str, vrf: str, afi: str, parsed: Dict) -> List[BGPEntry]:
+def _parse_bgp_genie(device_name: str, vrf: str, afi: str, parsed: Dict) -> List[BGPEntry]:
     """
-    Normalize BGP RIB into BGPEntry records.
+    Genie shape: vrf > <vrf> > address_family > "<afi> unicast" > routes > index.
     """
     out: List[BGPEntry] = []
     af_key = "ipv4 unicast" if afi == AFI4 else "ipv6 unicast"
+    bgp = parsed["vrf"].get(vrf, {}).get("address_family", {}).get(af_key, {})
+    routes = bgp.get("routes", {})
+    for pfx, pdata in routes.items():
+        idx = pdata.get("index", {})
+        for _, path in idx.items():
+            comms = normalize_communities(path.get("community"))
+            # Positional in BGPEntry field order: keyword matching over 16
+            # fields costs ~3x the construction on large tables
+            out.append(BGPEntry(
+                device_name, vrf, afi, pfx,
+                path.get("bestpath", False),  # best
+                _intern(path.get("next_hop")),  # nh
+                _intern(" ".join(path.get("as_path", [])) if isinstance(path.get("as_path"), list)
+                        else (path.get("as_path") or "")),  # as_path
+                path.get("localpref"),  # local_pref
+                path.get("med"),  # med
+                _intern(path.get("origin_code") or path.get("origin")),  # origin
+                comms,  # communities (truncated by BGPEntry; hash for full set)
+                set_hash(comms),  # communities_hash
+                path.get("weight"),  # weight
+                _intern(path.get("neighbor")),  # peer
+                path.get("originator_id"),  # originator_id
+                path.get("cluster_list") if isinstance(path.get("cluster_list"), list) else None,  # cluster_list
+            ))
+    return out
 
-    if "vrf" in parsed:
-        bgp = parsed["vrf"].get(vrf, {}).get("address_family", {}).get(af_key, {})
-        routes = bgp.get("routes", {})
-        for pfx, pdata in routes.items():
-            idx = pdata.get("index", {})
-            for _, path in idx.items():
-                comms = normalize_communities(path.get("community"))
-                out.append(BGPEntry(
-                    device=device_name, vrf=vrf, afi=afi, prefix=pfx,
-                    best=path.get("bestpath", False),
-                    nh=path.get("next_hop"),
-                    as_path=" ".join(path.get("as_path", [])) if isinstance(path.get("as_path"), list)
-                            else (path.get("as_path") or ""),
-                    local_pref=path.get("localpref"),
-                    med=path.get("med"),
-                    origin=path.get("origin_code") or path.get("origin"),
-                    communities=comms[:256],  # local storage truncated; hash for full set
-                    communities_hash=set_hash(comms),
-                    weight=path.get("weight"),
-                    peer=path.get("neighbor"),
-                    originator_id=path.get("originator_id"),
-                    cluster_list=path.get("cluster_list") if isinstance(path.get("cluster_list"), list) else None,
-                ))
-
-    # NX-API/NX-OS alternative JSON shapes
-    if not out and "TABLE_vrf" in parsed:
-        table_vrf = parsed.get("TABLE_vrf", {})
-        rows = table_vrf.get("ROW_vrf") or []
-        if isinstance(rows, dict):
-            rows = [rows]
-        for v in rows:
-            if v.get("vrf-name-out") != vrf:
+def _parse_bgp_nxapi(device_name: str, vrf: str, afi: str, parsed: Dict) -> List[BGPEntry]:
+    """
+    NX-API/NX-OS shape: TABLE_vrf > TABLE_afi > TABLE_safi > TABLE_rd > TABLE_prefix > TABLE_path.
+    """
+    out: List[BGPEntry] = []
+    af_codes = NXOS_BGP_AFI_CODES[afi]
+    for v in _rows(parsed, "TABLE_vrf", "ROW_vrf"):
+        if v.get("vrf-name-out") != vrf:
+            continue
+        table_af = v.get("TABLE_afi") or v.get("TABLE_af") or {}
+        afrows = table_af.get("ROW_afi") or table_af.get("ROW_af") or []
+        if isinstance(afrows, dict):
+            afrows = [afrows]
+        for af in afrows:
+            # Check AFI - can be "1" or 1 for IPv4 or "2" or 2 for IPv6, or text format
+            af_value = af.get("afi") or af.get("af")
+            if af_value not in af_codes and str(af_value) not in af_codes:
                 continue
-            table_af = v.get("TABLE_afi") or v.get("TABLE_af") or {}
-            afrows = table_af.get("ROW_afi") or table_af.get("ROW_af") or []
-            if isinstance(afrows, dict):
-                afrows = [afrows]
-            for af in afrows:
-                # Check AFI - can be "1" or 1 for IPv4 or "2" or 2 for IPv6, or text format
-                af_value = af.get("afi") or af.get("af")
-                af_value_str = str(af_value) if af_value is not None else ""
-                if afi == AFI4 and af_value_str not in ("1", "ipv4 unicast") and af_value not in (1, "ipv4 unicast"):
-                    continue
-                if afi == AFI6 and af_value_str not in ("2", "ipv6 unicast") and af_value not in (2, "ipv6 unicast"):
-                    continue
-                
-                # Navigate deeper structure: TABLE_safi > ROW_safi > TABLE_rd > ROW_rd > TABLE_prefix
-                table_safi = af.get("TABLE_safi") or {}
-                row_safi = table_safi.get("ROW_safi") or {}
-                if isinstance(row_safi, list):
-                    row_safi = row_safi[0] if row_safi else {}
-                
-                table_rd = row_safi.get("TABLE_rd") or {}
-                row_rd = table_rd.get("ROW_rd") or {}
-                if isinstance(row_rd, list):
-                    row_rd = row_rd[0] if row_rd else {}
-                
-                # Now get the prefix table
-                table_r = row_rd.get("TABLE_prefix") or af.get("TABLE_prefix") or {}
-                rrows = table_r.get("ROW_prefix") or []
-                if isinstance(rrows, dict):
-                    rrows = [rrows]
-                
-                for r in rrows:
-                    pfx = r.get("ipprefix") or r.get("ipv6prefix") or r.get("prefix")
-                    paths = r.get("TABLE_path", {}).get("ROW_path") or []
-                    if isinstance(paths, dict):
-                        paths = [paths]
-                    for path in paths:
-                        comms = normalize_communities(path.get("community"))
-                        # Check for best path - can be "bestpath" or True
-                        is_best = path.get("best") in ("bestpath", "true", True, 1) or path.get("bestcode") == ">"
-                        out.append(BGPEntry(
-                            device=device_name, vrf=vrf, afi=afi, prefix=pfx,
-                            best=is_best,
-                            nh=path.get("ipnexthop") or path.get("nexthop") or path.get("nh"),
-                            as_path=str(path.get("aspath") or ""),
-                            local_pref=path.get("localpref"),
-                            med=path.get("metric") or path.get("med"),
-                            origin=path.get("origin"),
-                            communities=comms[:256],
-                            communities_hash=set_hash(comms),
-                            weight=path.get("weight"),
-                            peer=path.get("neighbor_id") or path.get("peer"),
-                            originator_id=path.get("originator_id"),
-                            cluster_list=path.get("clusterlist") if isinstance(path.get("clusterlist"), list) else None,
-                        ))
+
+            # Navigate deeper structure: TABLE_safi > ROW_safi > TABLE_rd > ROW_rd > TABLE_prefix
+            row_rd = _first_row_along(af, NXOS_BGP_RD_PATH)
+
+            # Now get the prefix table
+            table_r = row_rd.get("TABLE_prefix") or af.get("TABLE_prefix") or {}
+            for r in _table_rows(table_r, "ROW_prefix"):
+                pfx = r.get("ipprefix") or r.get("ipv6prefix") or r.get("prefix")
+                for path in _rows(r, "TABLE_path", "ROW_path"):
+                    comms = normalize_communities(path.get("community"))
+                    # Check for best path - can be "bestpath" or True
+                    is_best = path.get("best") in ("bestpath", "true", True, 1) or path.get("bestcode") == ">"
+                    # Positional in BGPEntry field order (see above)
+                    out.append(BGPEntry(
+                        device_name, vrf, afi, pfx,
+                        is_best,  # best
+                        _intern(path.get("ipnexthop") or path.get("nexthop") or path.get("nh")),  # nh
+                        _intern(str(path.get("aspath") or "")),  # as_path
+                        path.get("localpref"),  # local_pref
+                        path.get("metric") or path.get("med"),  # med
+                        _intern(path.get("origin")),  # origin
+                        comms,  # communities
+                        set_hash(comms),  # communities_hash
+                        path.get("weight"),  # weight
+                        _intern(path.get("neighbor_id") or path.get("peer")),  # peer
+                        path.get("originator_id"),  # originator_id
+                        path.get("clusterlist") if isinstance(path.get("clusterlist"), list) else None,  # cluster_list
+                    ))
     return out
 
+# BGP output shapes, tried in order; each is recognised by its top-level key
+_BGP_SHAPES = (("vrf", _parse_bgp_genie), ("TABLE_vrf", _parse_bgp_nxapi))
+
+def parse_bgp(device_name: str, device_os: str, vrf: str, afi: str, parsed: Dict) -> List[BGPEntry]:
+    """
+    Normalize BGP RIB into BGPEntry records.
+    """
+    for marker, parse in _BGP_SHAPES:
+        if marker in parsed:
+            out = parse(device_name, vrf, afi, parsed)
+            if out:
+                return out
+    return []
+
+@lru_cache(maxsize=None)
+def table_commands(vrf: str, afi: str) -> Tuple[str, str]:
+    """
+    (RIB, BGP) show commands for one VRF/AFI; built once and shared across devices and polls.
+    """
+    if afi == AFI4:
+        return f"show ip route vrf {vrf}", f"show bgp vrf {vrf} ipv4 unicast"
+    return f"show ipv6 route vrf {vrf}", f"show bgp vrf {vrf} ipv6 unicast"
+
 def collect_device_tables(dev: Dict, vrfs: List[str], afis: List[str]) -> Dict:
     """
     Connect to a device, gather RIB and BGP across VRFs/AFIs, return normalized tables.
@@ -373,27 +496,36 @@ def collect_device_tables(dev: Dict, vrfs: List[str], afis: List[str]) -> Dict:
     # Map hostname to host if needed
     if "hostname" in conn_params and "host" not in conn_params:
         conn_params["host"] = conn_params.pop("hostname")
+
+    # Only show commands are sent; skip netmiko's conservative per-command delays
+    # unless the inventory says otherwise
+    conn_params.setdefault("fast_cli", True)
     
     conn = ConnectHandler(**conn_params)
     rib_all: List[RIBEntry] = []
     bgp_all: List[BGPEntry] = []
 
     try:
+        # One batched NX-API round-trip for every VRF/AFI table instead of one per command
+        prefetched = None
+        if _nxapi_enabled(device_os):
+            cmds = [cmd for vrf in vrfs for afi in afis for cmd in table_commands(vrf, afi)]
+            prefetched = _nxapi_fetch_all(conn_params, cmds)
+
         for vrf in vrfs:
             for afi in afis:
                 # RIB
-                rib_cmd = "show ip route vrf {}".format(vrf) if afi == AFI4 else "show ipv6 route vrf {}".format(vrf)
+                rib_cmd, bgp_cmd = table_commands(vrf, afi)
                 try:
-                    parsed = fetch_parsed(conn, device_name, device_os, rib_cmd, conn_params)
+                    parsed = fetch_parsed(conn, device_name, device_os, rib_cmd, conn_params, prefetched)
                     rib_all.extend(parse_rib(device_name, device_os, vrf, afi, parsed))
                 except Exception:
                     # swallow per-table errors to keep other tables flowing
                     pass
 
                 # BGP
-                bgp_cmd = f"show bgp vrf {vrf} {'ipv4 unicast' if afi==AFI4 else 'ipv6 unicast'}"
                 try:
-                    parsed = fetch_parsed(conn, device_name, device_os, bgp_cmd, conn_params)
+                    parsed = fetch_parsed(conn, device_name, device_os, bgp_cmd, conn_params, prefetched)
                     bgp_all.extend(parse_bgp(device_name, device_os, vrf, afi, parsed))
                 except Exception:
                     pass
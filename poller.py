@@ -5,21 +5,28 @@ Use --once for a single run (prints a JSON report).
 """
 
 import os, time, argparse, gzip
-from typing import List, Dict, Any
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from operator import itemgetter
+from typing import List, Dict, Any, Tuple
 import ujson as json
 from dotenv import load_dotenv
 
 from parsers import collect_device_tables
 from storage import (
     ensure_dir, device_root, table_dir, diffs_dir,
-    latest_path, ts_gz_path, write_latest, write_gz, read_latest
+    latest_path, ts_archive_path, write_latest, write_gz, write_archive, read_latest,
+    read_hash, encode_snapshot, encoded_hash, append_index
 )
-from diffing import rib_diff, bgp_diff
+from diffing import BGP_DIFF_ATTRS
 from models import RIBEntry, BGPEntry, AFI4, AFI6
 
 load_dotenv()
 
 SNAPDIR = os.environ.get("SNAPDIR", "./route_snaps")
+POLL_WORKERS = int(os.environ.get("POLL_WORKERS", "16"))
+# Worker processes for the serialize/diff/persist half of a poll (0 = do it on the fetch threads)
+POLL_PROCESSES = int(os.environ.get("POLL_PROCESSES", "0"))
 
 # --- Device inventory configuration ---
 # No hardcoded devices - all devices should be configured via web UI or environment
@@ -39,13 +46,99 @@ def get_inventory():
             out.append({**d, "vrfs": STATIC_VRFS, "afis": STATIC_AFIS})
         return out
 
+# Keys of serialized rows; same fields as RIBEntry.key() / BGPEntry.key()
+_rib_row_key = itemgetter("vrf", "afi", "prefix", "protocol")
+_bgp_row_key = itemgetter("vrf", "afi", "prefix")
+
 def serialize_rib(rows: List[RIBEntry]) -> List[Dict]:
     return [r.serialize() for r in rows]
 
 def serialize_bgp(rows: List[BGPEntry]) -> List[Dict]:
     return [r.serialize() for r in rows]
 
-def collect_and_persist_for_device(dev: Dict) -> Dict[str, Any]:
+# Dict-level diffs over serialized rows: one pass over the current index finds
+# additions and changes (identical rows are skipped with a single dict compare),
+# then removals come from the key-view difference.
+
+# Simple dict-level diff for RIB (same fields as RIBEntry.serialize())
+def rib_simple_diff(prev: List[Dict], curr: List[Dict]) -> Dict[str, Any]:
+    key = _rib_row_key
+    adds, rems, chgs = [], [], []
+    pi = {key(e): e for e in prev}
+    ci = {key(e): e for e in curr}
+    for k, b in ci.items():
+        a = pi.get(k)
+        if a is None:
+            adds.append(b)
+            continue
+        if a == b:
+            continue
+        delta = {}
+        if a.get("nexthops") != b.get("nexthops"): delta["nexthops"] = (a.get("nexthops"), b.get("nexthops"))
+        if a.get("distance") != b.get("distance"): delta["distance"] = (a.get("distance"), b.get("distance"))
+        if a.get("metric") != b.get("metric"):     delta["metric"]   = (a.get("metric"), b.get("metric"))
+        if a.get("best") != b.get("best"):         delta["best"]     = (a.get("best"), b.get("best"))
+        if delta:
+            chgs.append({**b, "delta": delta})
+    for k in pi.keys() - ci.keys():
+        rems.append(pi[k])
+    return {"adds": adds, "rems": rems, "chgs": chgs}
+
+def head_as(as_path: str) -> str:
+    parts = [p for p in (as_path or "").split() if p.isdigit()]
+    return parts[0] if parts else ""
+
+# BGP simple diff (serialized)
+def bgp_simple_diff(prev: List[Dict], curr: List[Dict]) -> Dict[str, Any]:
+    key = _bgp_row_key
+    pi = {key(e): e for e in prev}
+    ci = {key(e): e for e in curr}
+    adds, rems, chgs = [], [], []
+    for k, b in ci.items():
+        a = pi.get(k)
+        if a is None:
+            adds.append(b)
+            continue
+        if a == b:
+            continue
+        delta = {}
+        for attr in BGP_DIFF_ATTRS:
+            if a.get(attr) != b.get(attr):
+                delta[attr] = (a.get(attr), b.get(attr))
+        if "as_path" in delta:
+            a_head, b_head = head_as(a.get("as_path","")), head_as(b.get("as_path",""))
+            if a_head != b_head:
+                delta["upstream_as"] = (a_head, b_head)
+        if delta:
+            chgs.append({**b, "delta": delta})
+    for k in pi.keys() - ci.keys():
+        rems.append(pi[k])
+    return {"adds": adds, "rems": rems, "chgs": chgs}
+
+def diff_against_latest(latest: str, curr: List[Dict], raw: bytes, diff_fn) -> Dict[str, Any]:
+    """
+    Diff curr against the stored latest snapshot and make curr the new latest.
+    When curr hashes the same as the stored latest (the common steady state),
+    the previous snapshot is neither loaded nor diffed nor rewritten.
+    raw is curr as returned by encode_snapshot.
+    """
+    content_hash = encoded_hash(raw)
+    if content_hash == read_hash(latest):
+        return {"adds": [], "rems": [], "chgs": []}
+    d = diff_fn(read_latest(latest) or [], curr)
+    write_latest(latest, curr, content_hash=content_hash)
+    return d
+
+def _bucket_by_table(rows) -> Dict[Tuple[str, str], List]:
+    buckets: Dict[Tuple[str, str], List] = {}
+    for r in rows:
+        buckets.setdefault((r.vrf, r.afi), []).append(r)
+    return buckets
+
+def fetch_device_tables(dev: Dict) -> Dict:
+    """
+    I/O half of a poll: connect to the device and return its parsed tables.
+    """
     device = dev["name"]
     vrfs: List[str] = dev.get("vrfs") or ["default"]
     afis: List[str] = dev.get("afis") or [AFI4, AFI6]
@@ -55,130 +148,126 @@ def collect_and_persist_for_device(dev: Dict) -> Dict[str, Any]:
     ensure_dir(table_dir(SNAPDIR, device, "bgp"))
     ensure_dir(diffs_dir(SNAPDIR, device))
 
-    tables = collect_device_tables(dev, vrfs, afis)
+    return collect_device_tables(dev, vrfs, afis)
+
+def collect_and_persist_for_device(dev: Dict) -> Dict[str, Any]:
+    return persist_device_tables(dev, fetch_device_tables(dev))
+
+def persist_device_tables(dev: Dict, tables: Dict) -> Dict[str, Any]:
+    """
+    CPU half of a poll: serialize, diff against the latest snapshots and write archives.
+    """
+    device = dev["name"]
+    vrfs: List[str] = dev.get("vrfs") or ["default"]
+    afis: List[str] = dev.get("afis") or [AFI4, AFI6]
+
     rib_rows: List[RIBEntry] = tables["rib"]
     bgp_rows: List[BGPEntry] = tables["bgp"]
 
+    # Bucket rows by (vrf, afi) in one pass instead of rescanning every row per table
+    rib_by_table = _bucket_by_table(rib_rows)
+    bgp_by_table = _bucket_by_table(bgp_rows)
+
     report = {"device": device, "vrfs": {}}
 
     for vrf in vrfs:
         for afi in afis:
-            # Filter by vrf/afi
-            rib_now = [r for r in rib_rows if r.vrf == vrf and r.afi == afi]
-            bgp_now = [b for b in bgp_rows if b.vrf == vrf and b.afi == afi]
+            rib_now = rib_by_table.get((vrf, afi), [])
+            bgp_now = bgp_by_table.get((vrf, afi), [])
 
             rib_latest = latest_path(SNAPDIR, device, "rib", vrf, afi)
             bgp_latest = latest_path(SNAPDIR, device, "bgp", vrf, afi)
 
-            prev_rib_ser = read_latest(rib_latest) or []
-            prev_bgp_ser = read_latest(bgp_latest) or []
-
-            # Re-hydrate is not needed; compare serialized by fields we care about
-            rib_d = rib_diff(prev=[], curr=rib_now) if not prev_rib_ser else rib_diff(
-                prev=[RIBEntry(
-                    device=x["device"], vrf=x["vrf"], afi=x["afi"], prefix=x["prefix"],
-                    protocol=x["protocol"], distance=x.get("distance"), metric=x.get("metric"),
-                    best=x.get("best", False),
-                    nexthops=set([tuple(sorted([(nh["nh"], nh.get("iface")) for nh in x.get("nexthops", [])]))]) and
-                              set()  # we won't use this path—see below
-                ) for x in []],  # intentionally unused; we compare on serialized rows below
-                curr=rib_now
-            )
-            # Since RIBEntry contains sets of dataclasses, we rely on diffing from current normalized rows
-            # and the previous serialized is only used for storage/read. For a complete historical diff on restart,
-            # simply using serialized rows in prior run is sufficient when using our diff shape below.
-
-            # Better: load prev serialized and compare as dicts (lightweight)
-            prev_rib_simple = prev_rib_ser
+            # Serialize once; reused for the latest file and diff
             curr_rib_simple = [r.serialize() for r in rib_now]
-
-            # Simple dict-level diff for RIB (same fields as RIBEntry.serialize())
-            def rib_simple_diff(prev, curr):
-                from itertools import groupby
-                import json
-                key = lambda e: (e["vrf"], e["afi"], e["prefix"], e["protocol"])
-                prev_sorted = sorted(prev, key=key)
-                curr_sorted = sorted(curr, key=key)
-                adds, rems, chgs = [], [], []
-                pi = {key(e): e for e in prev_sorted}
-                ci = {key(e): e for e in curr_sorted}
-                for k in ci.keys() - pi.keys():
-                    adds.append(ci[k])
-                for k in pi.keys() - ci.keys():
-                    rems.append(pi[k])
-                for k in pi.keys() & ci.keys():
-                    a, b = pi[k], ci[k]
-                    delta = {}
-                    if a.get("nexthops") != b.get("nexthops"): delta["nexthops"] = (a.get("nexthops"), b.get("nexthops"))
-                    if a.get("distance") != b.get("distance"): delta["distance"] = (a.get("distance"), b.get("distance"))
-                    if a.get("metric") != b.get("metric"):     delta["metric"]   = (a.get("metric"), b.get("metric"))
-                    if a.get("best") != b.get("best"):         delta["best"]     = (a.get("best"), b.get("best"))
-                    if delta:
-                        chgs.append({**b, "delta": delta})
-                return {"adds": adds, "rems": rems, "chgs": chgs}
-
-            rib_d = rib_simple_diff(prev_rib_simple, curr_rib_simple)
-
-            # BGP simple diff (serialized)
-            prev_bgp_simple = prev_bgp_ser
             curr_bgp_simple = [b.serialize() for b in bgp_now]
 
-            def head_as(as_path: str) -> str:
-                parts = [p for p in (as_path or "").split() if p.isdigit()]
-                return parts[0] if parts else ""
-
-            def bgp_simple_diff(prev, curr):
-                key = lambda e: (e["vrf"], e["afi"], e["prefix"])
-                pi = {key(e): e for e in prev}
-                ci = {key(e): e for e in curr}
-                adds, rems, chgs = [], [], []
-                for k in ci.keys() - pi.keys():
-                    adds.append(ci[k])
-                for k in pi.keys() - ci.keys():
-                    rems.append(pi[k])
-                for k in pi.keys() & ci.keys():
-                    a, b = pi[k], ci[k]
-                    attrs = ["best","nh","as_path","local_pref","med","origin","communities_hash","peer"]
-                    delta = {}
-                    for attr in attrs:
-                        if a.get(attr) != b.get(attr):
-                            delta[attr] = (a.get(attr), b.get(attr))
-                    if head_as(a.get("as_path","")) != head_as(b.get("as_path","")):
-                        delta["upstream_as"] = (head_as(a.get("as_path","")), head_as(b.get("as_path","")))
-                    if delta:
-                        chgs.append({**b, "delta": delta})
-                return {"adds": adds, "rems": rems, "chgs": chgs}
-
-            bgp_d = bgp_simple_diff(prev_bgp_simple, curr_bgp_simple)
-
-            # Persist latest & archives
-            write_latest(rib_latest, curr_rib_simple)
-            write_latest(bgp_latest, curr_bgp_simple)
+            # Encode once; the same bytes are hashed and archived
+            rib_raw = encode_snapshot(curr_rib_simple)
+            bgp_raw = encode_snapshot(curr_bgp_simple)
+
+            rib_d = diff_against_latest(rib_latest, curr_rib_simple, rib_raw, rib_simple_diff)
+            bgp_d = diff_against_latest(bgp_latest, curr_bgp_simple, bgp_raw, bgp_simple_diff)
 
             # Timestamped archives
-            write_gz(ts_gz_path(SNAPDIR, device, "rib", vrf, afi), curr_rib_simple)
-            write_gz(ts_gz_path(SNAPDIR, device, "bgp", vrf, afi), curr_bgp_simple)
+            rib_archive = ts_archive_path(SNAPDIR, device, "rib", vrf, afi)
+            bgp_archive = ts_archive_path(SNAPDIR, device, "bgp", vrf, afi)
+            write_archive(rib_archive, rib_raw)
+            write_archive(bgp_archive, bgp_raw)
 
             # Diff archives (compact)
             diff_payload = {"device": device, "vrf": vrf, "afi": afi, "rib": rib_d, "bgp": bgp_d}
-            write_gz(os.path.join(diffs_dir(SNAPDIR, device), f"{vrf}.{afi}.{time.strftime('%Y%m%d%H%M%S', time.gmtime())}.json.gz"), diff_payload)
+            diff_archive = os.path.join(diffs_dir(SNAPDIR, device), f"{vrf}.{afi}.{time.strftime('%Y%m%d%H%M%S', time.gmtime())}.json.gz")
+            write_gz(diff_archive, diff_payload)
+
+            append_index(SNAPDIR, device, [("rib", rib_archive), ("bgp", bgp_archive), ("diff", diff_archive)])
 
             report["vrfs"].setdefault(vrf, {})[afi] = diff_payload
 
     return report
 
+def _collect_one(dev: Dict) -> Dict[str, Any]:
+    try:
+        return collect_and_persist_for_device(dev)
+    except Exception as e:
+        return {"device": dev["name"], "error": str(e)}
+
+def _persist_one(dev: Dict, tables: Dict) -> Dict[str, Any]:
+    try:
+        return persist_device_tables(dev, tables)
+    except Exception as e:
+        return {"device": dev["name"], "error": str(e)}
+
+def _collect_split(inv: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Fetch on threads and hand each device's tables to a process pool as soon as
+    they arrive, so serialize/diff work for large tables is not serialized by the GIL.
+    Workers come from a forkserver: the pool starts them lazily, after the fetch
+    threads are running, and forking this process then could copy locks (logging,
+    paramiko) held by those threads and deadlock the child.
+    """
+    reports: List[Any] = [None] * len(inv)
+    with ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(inv))) as io_pool, \
+            ProcessPoolExecutor(
+                max_workers=POLL_PROCESSES, mp_context=multiprocessing.get_context("forkserver")
+            ) as cpu_pool:
+        fetches = {io_pool.submit(fetch_device_tables, dev): i for i, dev in enumerate(inv)}
+        persists = {}
+        for fut in as_completed(fetches):
+            i = fetches[fut]
+            try:
+                persists[cpu_pool.submit(_persist_one, inv[i], fut.result())] = i
+            except Exception as e:
+                reports[i] = {"device": inv[i]["name"], "error": str(e)}
+        for fut in as_completed(persists):
+            i = persists[fut]
+            try:
+                reports[i] = fut.result()
+            except Exception as e:
+                reports[i] = {"device": inv[i]["name"], "error": str(e)}
+    return reports
+
+def collect_all(inv: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Collect every device concurrently. Collection is dominated by SSH/NX-API waits,
+    so a thread pool brings a cycle down to roughly the slowest device.
+    With POLL_PROCESSES > 0 the parse/diff/persist half runs in worker processes.
+    Reports are returned in inventory order.
+    """
+    if len(inv) <= 1:
+        return [_collect_one(dev) for dev in inv]
+    if POLL_PROCESSES > 0:
+        return _collect_split(inv)
+    with ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(inv))) as pool:
+        return list(pool.map(_collect_one, inv))
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--once", action="store_true", help="Run a single collection and print report")
     args = ap.parse_args()
 
     inv = get_inventory()
-    reports = []
-    for dev in inv:
-        try:
-            reports.append(collect_and_persist_for_device(dev))
-        except Exception as e:
-            reports.append({"device": dev["name"], "error": str(e)})
+    reports = collect_all(inv)
 
     if args.once:
         print(json.dumps(reports, indent=2))
@@ -188,14 +277,10 @@ def main():
         while True:
             start = time.time()
             inv = get_inventory()
-            for dev in inv:
-                try:
-                    collect_and_persist_for_device(dev)
-                except Exception:
-                    pass
+            collect_all(inv)
             elapsed = time.time() - start
             sleep_for = max(1, interval - int(elapsed))
             time.sleep(sleep_for)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
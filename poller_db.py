@@ -17,7 +17,7 @@ from parsers import collect_device_tables, discover_vrfs
 from models import RIBEntry, BGPEntry, AFI4, AFI6
 from database import get_session
 from device_manager import DeviceManager
-from storage_db import DatabaseStorage
+from storage_db import DatabaseStorage, snapshot_hash
 
 load_dotenv()
 
@@ -45,19 +45,23 @@ def collect_and_persist_for_device(dev: Dict, storage: DatabaseStorage) -> Dict[
             curr_rib_data = {r.prefix: r.serialize() for r in rib_now}
             curr_bgp_data = {b.prefix: b.serialize() for b in bgp_now}
             
+            # Hash once; used for the unchanged-snapshot check and stored with the snapshot
+            rib_hash = snapshot_hash(curr_rib_data)
+            bgp_hash = snapshot_hash(curr_bgp_data)
+            
             # Compute and save diffs
             timestamp = datetime.utcnow()
             
             rib_diff = storage.compute_and_save_diff(
-                device_name, "rib", vrf, afi, curr_rib_data, timestamp
+                device_name, "rib", vrf, afi, curr_rib_data, timestamp, rib_hash
             )
             bgp_diff = storage.compute_and_save_diff(
-                device_name, "bgp", vrf, afi, curr_bgp_data, timestamp
+                device_name, "bgp", vrf, afi, curr_bgp_data, timestamp, bgp_hash
             )
             
             # Save snapshots
-            storage.save_snapshot(device_name, "rib", vrf, afi, curr_rib_data, timestamp)
-            storage.save_snapshot(device_name, "bgp", vrf, afi, curr_bgp_data, timestamp)
+            storage.save_snapshot(device_name, "rib", vrf, afi, curr_rib_data, timestamp, rib_hash)
+            storage.save_snapshot(device_name, "bgp", vrf, afi, curr_bgp_data, timestamp, bgp_hash)
             
             # Build report
             vrf_afi_report = {
@@ -0,0 +1,49 @@
+"""
+static_cache.py
+Serve the web UI's static files from memory, for the web UI apps.
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+from typing import Dict, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+
+def load_assets(directory: str) -> Dict[str, Tuple[bytes, str, str]]:
+    """Map each file's URL path under directory to (body, strong ETag, media type)."""
+    assets = {}
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            fp = os.path.join(root, name)
+            rel = os.path.relpath(fp, directory).replace(os.sep, "/")
+            with open(fp, "rb") as f:
+                body = f.read()
+            etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            assets[rel] = (body, etag, media_type)
+    return assets
+
+
+def mount_cached_static(app: FastAPI, directory: str):
+    """
+    Serve directory at / like StaticFiles(html=True), but from files read once here:
+    no stat or read per request. Changes under directory need a restart to show up.
+    Asset names carry no content hash, so browsers revalidate (no-cache) and get a
+    304 while the ETag still matches.
+    """
+    assets = load_assets(directory)
+
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def static_asset(request: Request, path: str):
+        asset = assets.get(path) or assets.get(posixpath.join(path, "index.html"))
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        body, etag, media_type = asset
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type=media_type, headers=headers)
@@ -1,14 +1,32 @@
 """
 storage.py
-Snapshot persistence: latest & timestamped gzip archives; loading helpers.
+Snapshot persistence: latest & timestamped gzip/zstd archives; loading helpers.
 """
 
-import os, gzip, time
-from typing import Any, List, Dict
-import ujson as json
+import os, re, gzip, hashlib, mmap, time
+from typing import Any, List, Dict, Optional, Tuple
+import orjson
+
+# Snapshots below this size are read in one call; mmap setup costs more than it saves
+MMAP_MIN_BYTES = 1 << 20
+
+# Timestamped snapshot archive format: "gz" (default) or "zst" (needs the zstandard package)
+ARCHIVE_FORMAT = os.environ.get("ARCHIVE_FORMAT", "gz")
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "3"))
+# Archives are written every poll and read rarely; favour speed over ratio
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "1"))
+# fsync latest snapshots before renaming; off by default since the next poll rewrites them
+DURABLE = os.environ.get("DURABLE", "false").lower() in ("1", "true", "yes")
+
+# Directories already created by this process; snapshot writes hit the same few every poll.
+# A directory removed while the poller runs is not recreated until restart.
+_known_dirs: set = set()
 
 def ensure_dir(path: str):
+    if path in _known_dirs:
+        return
     os.makedirs(path, exist_ok=True)
+    _known_dirs.add(path)
 
 def device_root(snapdir: str, device: str) -> str:
     return os.path.join(snapdir, device)
@@ -23,23 +41,162 @@ def latest_path(snapdir: str, device: str, table: str, vrf: str, afi: str) -> st
     return os.path.join(table_dir(snapdir, device, table), f"{vrf}.{afi}.latest.json")
 
 def ts_gz_path(snapdir: str, device: str, table: str, vrf: str, afi: str) -> str:
+    return ts_archive_path(snapdir, device, table, vrf, afi, fmt="gz")
+
+def ts_archive_path(snapdir: str, device: str, table: str, vrf: str, afi: str, fmt: Optional[str] = None) -> str:
     ts = time.strftime("%Y%m%d%H%M%S", time.gmtime())
-    return os.path.join(table_dir(snapdir, device, table), f"{vrf}.{afi}.{ts}.json.gz")
+    return os.path.join(table_dir(snapdir, device, table), f"{vrf}.{afi}.{ts}.json.{fmt or ARCHIVE_FORMAT}")
 
-def write_latest(path: str, data: Any):
-    ensure_dir(os.path.dirname(path))
+def index_path(snapdir: str, device: str) -> str:
+    return os.path.join(device_root(snapdir, device), "index.jsonl")
+
+def hash_path(latest: str) -> str:
+    """<vrf>.<afi>.latest.json -> <vrf>.<afi>.latest.hash"""
+    return os.path.splitext(latest)[0] + ".hash"
+
+def encode_snapshot(data: Any) -> bytes:
+    """Compact, key-sorted JSON encoding; what snapshot_hash hashes and write_gz can store as-is."""
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+
+def snapshot_hash(data: Any) -> str:
+    """Stable content hash of a serialized snapshot (key order independent)."""
+    return encoded_hash(encode_snapshot(data))
+
+def encoded_hash(raw: bytes) -> str:
+    """snapshot_hash for data already passed through encode_snapshot."""
+    return hashlib.sha256(raw).hexdigest()
+
+def read_hash(latest: str) -> Optional[str]:
+    try:
+        with open(hash_path(latest)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _write_atomic(path: str, buf: bytes):
+    """Write buf to path via a temp file and rename; fsync only when DURABLE is set."""
     tmp = path + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(data, f, indent=2, sort_keys=True)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+        if DURABLE:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
     os.replace(tmp, path)
 
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def write_latest(path: str, data: Any, content_hash: Optional[str] = None):
+    ensure_dir(os.path.dirname(path))
+    hp = hash_path(path)
+    # Drop the old hash first, whether or not a new one is given, so it is never
+    # paired with new content (after a crash mid-write or a write without a hash)
+    _remove_quietly(hp)
+    _write_atomic(path, orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+    if content_hash is not None:
+        _write_atomic(hp, content_hash.encode())
+
 def write_gz(path: str, data: Any):
+    """Write data gzipped; bytes are taken as already-encoded JSON (see encode_snapshot)."""
     ensure_dir(os.path.dirname(path))
-    with gzip.open(path, "wt") as f:
-        json.dump(data, f)
+    tmp = path + ".tmp"
+    try:
+        # No mtime or name in the header, so identical snapshots compress to identical bytes
+        with open(tmp, "wb") as raw, gzip.GzipFile(filename="", fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as f:
+            f.write(data if isinstance(data, bytes) else orjson.dumps(data))
+        os.replace(tmp, path)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+
+def write_zst(path: str, data: Any):
+    """Write data zstd-compressed (same input rules as write_gz), via a temp file and rename."""
+    import zstandard  # optional; only needed when ARCHIVE_FORMAT=zst
+    ensure_dir(os.path.dirname(path))
+    raw = data if isinstance(data, bytes) else orjson.dumps(data)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw))
+        os.replace(tmp, path)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+
+def write_archive(path: str, data: Any):
+    """Write a timestamped archive in the format named by its extension."""
+    if path.endswith(".zst"):
+        write_zst(path, data)
+    else:
+        write_gz(path, data)
 
 def read_latest(path: str) -> Any:
-    if not os.path.exists(path):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
         return None
-    with open(path) as f:
-        return json.load(f)
\ No newline at end of file
+    with f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return orjson.loads(f.read())
+        # Parse straight from the page cache instead of copying into a bytes object
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as buf:
+                return orjson.loads(buf)
+
+# --- Archive index ---
+# {device}/index.jsonl holds one {"table","vrf","afi","ts","name","size"} line per
+# timestamped archive ("diff" for the diffs dir), so readers need no directory scans.
+# It grows with the archives (three lines per VRF/AFI per poll). After archives are
+# pruned, delete index.jsonl (or call rebuild_index): the next poll rebuilds it from
+# the files still on disk.
+
+_ARCHIVE_NAME_PAT = re.compile(r"^(?P<vrf>[^.]+)\.(?P<afi>ipv4|ipv6)\.(?P<ts>\d{14})\.json\.(?:gz|zst)$")
+
+def _index_line(table: str, path: str) -> Optional[bytes]:
+    name = os.path.basename(path)
+    m = _ARCHIVE_NAME_PAT.match(name)
+    if not m:
+        return None
+    rec = {"table": table, "vrf": m.group("vrf"), "afi": m.group("afi"), "ts": m.group("ts"),
+           "name": name, "size": os.path.getsize(path)}
+    return orjson.dumps(rec) + b"\n"
+
+def rebuild_index(snapdir: str, device: str):
+    """Write the device's index from the archives currently on disk."""
+    lines = []
+    for table, d in (("rib", table_dir(snapdir, device, "rib")),
+                     ("bgp", table_dir(snapdir, device, "bgp")),
+                     ("diff", diffs_dir(snapdir, device))):
+        try:
+            with os.scandir(d) as it:
+                names = sorted(e.name for e in it if e.is_file())
+        except FileNotFoundError:
+            continue
+        lines.extend(filter(None, (_index_line(table, os.path.join(d, n)) for n in names)))
+    _write_atomic(index_path(snapdir, device), b"".join(lines))
+
+def append_index(snapdir: str, device: str, archives: List[Tuple[str, str]]):
+    """
+    Record freshly written archives, given as (table, path) pairs, in the device index.
+    A device without an index gets one built from its existing archives instead.
+    """
+    ip = index_path(snapdir, device)
+    if not os.path.exists(ip):
+        rebuild_index(snapdir, device)
+        return
+    buf = b"".join(filter(None, (_index_line(table, p) for table, p in archives)))
+    # O_APPEND, looping on short writes; readers skip a line they catch half-written
+    fd = os.open(ip, os.O_WRONLY | os.O_APPEND)
+    try:
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
@@ -1,15 +1,166 @@
 """Database-based storage for route snapshots and diffs."""
 
-import json
+import csv
+import gzip
+import io
+import os
+import re
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple, Iterator
 
+import orjson
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy import (
+    desc, and_, or_, select, insert, delete, bindparam, func, literal, union_all, Text
+)
 
 from database import (
-    get_session, Device, RouteSnapshot, BGPSnapshot, RouteDiff
+    get_session, normalize_changed, Device, RouteSnapshot, BGPSnapshot, RouteDiff
 )
+from storage import snapshot_hash
+
+
+# Statements used on every poll/request are built once at import time so
+# SQLAlchemy can reuse their cached compiled form instead of rebuilding and
+# recompiling an ORM query on each call.
+_Q_DEVICE_ID = select(Device.id).where(Device.name == bindparam("name"))
+
+# Snapshot model per table type; every snapshot query is built from one
+# template and picked by dict lookup rather than an if/elif per method.
+_SNAPSHOT_MODELS = {"rib": RouteSnapshot, "bgp": BGPSnapshot}
+
+
+def _snapshot_filter(model):
+    return (
+        model.device_id == bindparam("did"),
+        model.vrf == bindparam("vrf"),
+        model.afi == bindparam("afi"),
+    )
+
+
+_Q_LATEST = {
+    table_type: select(model.data)
+    .where(*_snapshot_filter(model))
+    .order_by(desc(model.timestamp))
+    .limit(1)
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+_Q_LATEST_HASH = {
+    table_type: select(model.content_hash)
+    .where(*_snapshot_filter(model))
+    .order_by(desc(model.timestamp))
+    .limit(1)
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+_Q_AT_TIME = {
+    table_type: select(model.data)
+    .where(*_snapshot_filter(model), model.timestamp == bindparam("ts"))
+    .limit(1)
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+# (id, timestamp) of the snapshot the two queries above would load; enough for
+# an ETag without reading the data column.
+_Q_LATEST_META = {
+    table_type: select(model.id, model.timestamp)
+    .where(*_snapshot_filter(model))
+    .order_by(desc(model.timestamp))
+    .limit(1)
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+_Q_AT_TIME_META = {
+    table_type: select(model.id, model.timestamp)
+    .where(*_snapshot_filter(model), model.timestamp == bindparam("ts"))
+    .limit(1)
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+_Q_BY_ID = {
+    table_type: select(model.data).where(model.id == bindparam("id"))
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+_Q_LIST = {
+    table_type: select(model.timestamp)
+    .where(*_snapshot_filter(model))
+    .order_by(desc(model.timestamp))
+    .limit(bindparam("limit"))
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+# Next page of _Q_LIST: keyset on timestamp, so deep pages cost the same as the first
+_Q_LIST_BEFORE = {
+    table_type: select(model.timestamp)
+    .where(*_snapshot_filter(model), model.timestamp < bindparam("before"))
+    .order_by(desc(model.timestamp))
+    .limit(bindparam("limit"))
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+# Inserts taking the snapshot as JSON text, so already-serialized data skips the
+# Python dict -> JSON round trip. The text is bound as-is (no CAST: on SQLite,
+# CAST(? AS JSONB) has NUMERIC affinity and would store 0); PostgreSQL loads
+# through COPY instead and parses the text into JSONB itself.
+_INSERT_JSON = {
+    table_type: insert(model).values(
+        device_id=bindparam("did"),
+        vrf=bindparam("vrf"),
+        afi=bindparam("afi"),
+        timestamp=bindparam("ts"),
+        data=bindparam("data", type_=Text),
+        route_count=bindparam("route_count"),
+        content_hash=bindparam("content_hash"),
+    )
+    for table_type, model in _SNAPSHOT_MODELS.items()
+}
+
+# Column order of the rows passed to DatabaseStorage.copy_snapshots_json
+_COPY_COLUMNS = ("device_id", "vrf", "afi", "timestamp", "data", "route_count", "content_hash")
+
+# RIB and BGP (vrf, afi) combinations in one round trip; the leading
+# (device_id, vrf, afi) columns of each composite index serve the DISTINCT.
+_Q_TABLES = union_all(*(
+    select(literal(table_type).label("table_type"), model.vrf, model.afi)
+    .where(model.device_id == bindparam("did"))
+    .distinct()
+    for table_type, model in _SNAPSHOT_MODELS.items()
+))
+
+# Newest snapshot time per (device, table type) for one VRF/AFI, across all
+# devices in a single round trip (served by the composite indexes).
+def _latest_times(*device_filter):
+    return union_all(*(
+        select(literal(table_type).label("table_type"), Device.name, func.max(model.timestamp))
+        .join(Device, Device.id == model.device_id)
+        .where(model.vrf == bindparam("vrf"), model.afi == bindparam("afi"), *device_filter)
+        .group_by(Device.name)
+        for table_type, model in _SNAPSHOT_MODELS.items()
+    ))
+
+
+_Q_LATEST_TIMES = _latest_times()
+_Q_LATEST_TIMES_ENABLED = _latest_times(Device.enabled == True)
+
+
+def _diff_page(stmt, before: Optional[datetime], before_id: Optional[int]):
+    """
+    Order a RouteDiff query newest first and keep only rows past the
+    (before, before_id) cursor. The rib and bgp diffs of one poll share a
+    timestamp, so the id breaks the tie and a page boundary between them
+    loses neither.
+    """
+    if before is not None:
+        cursor = RouteDiff.timestamp < before
+        if before_id is not None:
+            cursor = or_(cursor, and_(RouteDiff.timestamp == before, RouteDiff.id < before_id))
+        stmt = stmt.where(cursor)
+    return stmt.order_by(desc(RouteDiff.timestamp), desc(RouteDiff.id))
 
 
 class DatabaseStorage:
@@ -19,6 +170,10 @@ class DatabaseStorage:
         """Initialize with database session."""
         self.session = session or get_session()
     
+    def _device_id(self, device_name: str) -> Optional[int]:
+        """Look up a device's primary key by name."""
+        return self.session.execute(_Q_DEVICE_ID, {"name": device_name}).scalar()
+    
     def save_snapshot(
         self,
         device_name: str,
@@ -26,44 +181,84 @@ class DatabaseStorage:
         vrf: str,
         afi: str,
         data: Dict[str, Any],
-        timestamp: Optional[datetime] = None
+        timestamp: Optional[datetime] = None,
+        content_hash: Optional[str] = None
     ) -> None:
-        """Save a snapshot to database."""
+        """Save a snapshot to database.
+        
+        Pass content_hash when the caller has already computed
+        snapshot_hash(data) to avoid hashing the snapshot twice.
+        """
         timestamp = timestamp or datetime.utcnow()
         
+        model = _SNAPSHOT_MODELS.get(table_type)
+        if model is None:
+            raise ValueError(f"Invalid table_type: {table_type}")
+        
         # Get device
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             raise ValueError(f"Device '{device_name}' not found in database")
         
-        # Count routes
-        route_count = len(data)
-        
-        # Choose the right model
-        if table_type == "rib":
-            snapshot = RouteSnapshot(
-                device_id=device.id,
-                vrf=vrf,
-                afi=afi,
-                timestamp=timestamp,
-                data=data,
-                route_count=route_count
-            )
-        elif table_type == "bgp":
-            snapshot = BGPSnapshot(
-                device_id=device.id,
-                vrf=vrf,
-                afi=afi,
-                timestamp=timestamp,
-                data=data,
-                route_count=route_count
-            )
-        else:
-            raise ValueError(f"Invalid table_type: {table_type}")
-        
+        snapshot = model(
+            device_id=device_id,
+            vrf=vrf,
+            afi=afi,
+            timestamp=timestamp,
+            data=data,
+            route_count=len(data),
+            content_hash=content_hash or snapshot_hash(data)
+        )
         self.session.add(snapshot)
         self.session.commit()
     
+    def copy_snapshots_json(
+        self,
+        table_type: str,
+        rows: List[Tuple[int, str, str, datetime, str, int, Optional[str]]]
+    ) -> None:
+        """Bulk-load serialized snapshots.
+        
+        Each row is (device_id, vrf, afi, timestamp, json_text, route_count,
+        content_hash). On PostgreSQL the rows are streamed with COPY; other
+        databases fall back to a batched INSERT.
+        """
+        model = _SNAPSHOT_MODELS.get(table_type)
+        if model is None:
+            raise ValueError(f"Invalid table_type: {table_type}")
+        if not rows:
+            return
+        
+        try:
+            connection = self.session.connection()
+            if connection.dialect.name == "postgresql":
+                buf = io.StringIO()
+                csv.writer(buf).writerows(rows)
+                buf.seek(0)
+                with connection.connection.cursor() as cur:
+                    cur.copy_expert(
+                        f"COPY {model.__tablename__} "
+                        f"({', '.join(_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                        buf
+                    )
+            else:
+                self.session.execute(_INSERT_JSON[table_type], [
+                    {
+                        "did": device_id,
+                        "vrf": vrf,
+                        "afi": afi,
+                        "ts": timestamp,
+                        "data": raw,
+                        "route_count": route_count,
+                        "content_hash": content_hash,
+                    }
+                    for device_id, vrf, afi, timestamp, raw, route_count, content_hash in rows
+                ])
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+    
     def get_latest_snapshot(
         self,
         device_name: str,
@@ -72,30 +267,17 @@ class DatabaseStorage:
         afi: str
     ) -> Optional[Dict[str, Any]]:
         """Get the latest snapshot for a device/vrf/afi combination."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        stmt = _Q_LATEST.get(table_type)
+        if stmt is None:
             return None
         
-        if table_type == "rib":
-            snapshot = self.session.query(RouteSnapshot).filter(
-                and_(
-                    RouteSnapshot.device_id == device.id,
-                    RouteSnapshot.vrf == vrf,
-                    RouteSnapshot.afi == afi
-                )
-            ).order_by(desc(RouteSnapshot.timestamp)).first()
-        elif table_type == "bgp":
-            snapshot = self.session.query(BGPSnapshot).filter(
-                and_(
-                    BGPSnapshot.device_id == device.id,
-                    BGPSnapshot.vrf == vrf,
-                    BGPSnapshot.afi == afi
-                )
-            ).order_by(desc(BGPSnapshot.timestamp)).first()
-        else:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             return None
         
-        return snapshot.data if snapshot else None
+        return self.session.execute(
+            stmt, {"did": device_id, "vrf": vrf, "afi": afi}
+        ).scalar()
     
     def get_snapshot_at_time(
         self,
@@ -106,32 +288,47 @@ class DatabaseStorage:
         timestamp: datetime
     ) -> Optional[Dict[str, Any]]:
         """Get a specific snapshot by timestamp."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        stmt = _Q_AT_TIME.get(table_type)
+        if stmt is None:
             return None
         
-        if table_type == "rib":
-            snapshot = self.session.query(RouteSnapshot).filter(
-                and_(
-                    RouteSnapshot.device_id == device.id,
-                    RouteSnapshot.vrf == vrf,
-                    RouteSnapshot.afi == afi,
-                    RouteSnapshot.timestamp == timestamp
-                )
-            ).first()
-        elif table_type == "bgp":
-            snapshot = self.session.query(BGPSnapshot).filter(
-                and_(
-                    BGPSnapshot.device_id == device.id,
-                    BGPSnapshot.vrf == vrf,
-                    BGPSnapshot.afi == afi,
-                    BGPSnapshot.timestamp == timestamp
-                )
-            ).first()
-        else:
+        device_id = self._device_id(device_name)
+        if device_id is None:
+            return None
+        
+        return self.session.execute(
+            stmt, {"did": device_id, "vrf": vrf, "afi": afi, "ts": timestamp}
+        ).scalar()
+    
+    def get_snapshot_meta(
+        self,
+        device_name: str,
+        table_type: str,
+        vrf: str,
+        afi: str,
+        timestamp: Optional[datetime] = None
+    ) -> Optional[Tuple[int, datetime]]:
+        """(id, timestamp) of the latest snapshot, or of the one at timestamp."""
+        stmts = _Q_LATEST_META if timestamp is None else _Q_AT_TIME_META
+        stmt = stmts.get(table_type)
+        if stmt is None:
             return None
         
-        return snapshot.data if snapshot else None
+        device_id = self._device_id(device_name)
+        if device_id is None:
+            return None
+        
+        row = self.session.execute(
+            stmt, {"did": device_id, "vrf": vrf, "afi": afi, "ts": timestamp}
+        ).first()
+        return tuple(row) if row is not None else None
+    
+    def get_snapshot_by_id(self, table_type: str, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """Get a snapshot's data by primary key (see get_snapshot_meta)."""
+        stmt = _Q_BY_ID.get(table_type)
+        if stmt is None:
+            return None
+        return self.session.execute(stmt, {"id": snapshot_id}).scalar()
     
     def list_snapshots(
         self,
@@ -139,33 +336,21 @@ class DatabaseStorage:
         table_type: str,
         vrf: str,
         afi: str,
-        limit: int = 100
+        limit: int = 100,
+        before: Optional[datetime] = None
     ) -> List[datetime]:
-        """List available snapshot timestamps."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        """List available snapshot timestamps, newest first, optionally only those older than before."""
+        stmt = (_Q_LIST if before is None else _Q_LIST_BEFORE).get(table_type)
+        if stmt is None:
             return []
         
-        if table_type == "rib":
-            snapshots = self.session.query(RouteSnapshot.timestamp).filter(
-                and_(
-                    RouteSnapshot.device_id == device.id,
-                    RouteSnapshot.vrf == vrf,
-                    RouteSnapshot.afi == afi
-                )
-            ).order_by(desc(RouteSnapshot.timestamp)).limit(limit).all()
-        elif table_type == "bgp":
-            snapshots = self.session.query(BGPSnapshot.timestamp).filter(
-                and_(
-                    BGPSnapshot.device_id == device.id,
-                    BGPSnapshot.vrf == vrf,
-                    BGPSnapshot.afi == afi
-                )
-            ).order_by(desc(BGPSnapshot.timestamp)).limit(limit).all()
-        else:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             return []
         
-        return [s[0] for s in snapshots]
+        return list(self.session.execute(
+            stmt, {"did": device_id, "vrf": vrf, "afi": afi, "limit": limit, "before": before}
+        ).scalars())
     
     def save_diff(
         self,
@@ -179,12 +364,12 @@ class DatabaseStorage:
         """Save a diff to database."""
         timestamp = timestamp or datetime.utcnow()
         
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             raise ValueError(f"Device '{device_name}' not found in database")
         
         diff_entry = RouteDiff(
-            device_id=device.id,
+            device_id=device_id,
             vrf=vrf,
             afi=afi,
             table_type=table_type,
@@ -203,27 +388,109 @@ class DatabaseStorage:
         vrf: str,
         afi: str,
         table_type: Optional[str] = None,
-        limit: int = 20
+        limit: int = 20,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Get recent diffs for a device/vrf/afi."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        """Get recent diffs for a device/vrf/afi, newest first.
+        
+        Pass the last diff's timestamp and id as before/before_id to get the
+        next page; before alone returns only diffs strictly older than it.
+        """
+        device_id = self._device_id(device_name)
+        if device_id is None:
             return []
         
-        query = self.session.query(RouteDiff).filter(
-            and_(
-                RouteDiff.device_id == device.id,
-                RouteDiff.vrf == vrf,
-                RouteDiff.afi == afi
-            )
+        # Select plain columns rather than ORM objects: no identity-map
+        # bookkeeping and no lazy load of RouteDiff.device per row.
+        stmt = select(
+            RouteDiff.id,
+            RouteDiff.table_type,
+            RouteDiff.timestamp,
+            RouteDiff.added,
+            RouteDiff.removed,
+            RouteDiff.changed,
+        ).where(
+            RouteDiff.device_id == device_id,
+            RouteDiff.vrf == vrf,
+            RouteDiff.afi == afi
         )
         
         if table_type:
-            query = query.filter(RouteDiff.table_type == table_type)
+            stmt = stmt.where(RouteDiff.table_type == table_type)
+        
+        rows = self.session.execute(_diff_page(stmt, before, before_id).limit(limit))
+        
+        return [
+            {
+                "id": row.id,
+                "device": device_name,
+                "vrf": vrf,
+                "afi": afi,
+                "table_type": row.table_type,
+                "timestamp": row.timestamp.isoformat(),
+                "added": row.added,
+                "removed": row.removed,
+                "changed": normalize_changed(row.changed),
+            }
+            for row in rows
+        ]
+    
+    def get_diff_summaries(
+        self,
+        device_name: str,
+        vrf: str,
+        afi: str,
+        table_type: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Like get_diffs, but "added"/"removed"/"changed" are the array lengths,
+        computed by the database so the diff payloads never leave it.
+        """
+        device_id = self._device_id(device_name)
+        if device_id is None:
+            return []
         
-        diffs = query.order_by(desc(RouteDiff.timestamp)).limit(limit).all()
+        array_length = (
+            func.jsonb_array_length
+            if self.session.get_bind().dialect.name == "postgresql"
+            else func.json_array_length
+        )
+        stmt = select(
+            RouteDiff.id,
+            RouteDiff.table_type,
+            RouteDiff.timestamp,
+            func.coalesce(array_length(RouteDiff.added), 0).label("added"),
+            func.coalesce(array_length(RouteDiff.removed), 0).label("removed"),
+            func.coalesce(array_length(RouteDiff.changed), 0).label("changed"),
+        ).where(
+            RouteDiff.device_id == device_id,
+            RouteDiff.vrf == vrf,
+            RouteDiff.afi == afi
+        )
         
-        return [d.to_dict() for d in diffs]
+        if table_type:
+            stmt = stmt.where(RouteDiff.table_type == table_type)
+        
+        rows = self.session.execute(_diff_page(stmt, before, before_id).limit(limit))
+        
+        return [
+            {
+                "id": row.id,
+                "device": device_name,
+                "vrf": vrf,
+                "afi": afi,
+                "table_type": row.table_type,
+                "timestamp": row.timestamp.isoformat(),
+                "added": row.added,
+                "removed": row.removed,
+                "changed": row.changed,
+            }
+            for row in rows
+        ]
     
     def get_diff_at_time(
         self,
@@ -234,13 +501,13 @@ class DatabaseStorage:
         timestamp: datetime
     ) -> Optional[Dict[str, Any]]:
         """Get a specific diff by timestamp."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             return None
         
         diff = self.session.query(RouteDiff).filter(
             and_(
-                RouteDiff.device_id == device.id,
+                RouteDiff.device_id == device_id,
                 RouteDiff.table_type == table_type,
                 RouteDiff.vrf == vrf,
                 RouteDiff.afi == afi,
@@ -254,56 +521,44 @@ class DatabaseStorage:
         """Delete snapshots older than specified days."""
         cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
         
-        # Delete old RIB snapshots
-        rib_deleted = self.session.query(RouteSnapshot).filter(
-            RouteSnapshot.timestamp < cutoff_date
-        ).delete()
-        
-        # Delete old BGP snapshots
-        bgp_deleted = self.session.query(BGPSnapshot).filter(
-            BGPSnapshot.timestamp < cutoff_date
-        ).delete()
-        
-        # Delete old diffs
-        diff_deleted = self.session.query(RouteDiff).filter(
-            RouteDiff.timestamp < cutoff_date
-        ).delete()
+        # Core DELETEs with synchronize_session=False skip scanning the identity
+        # map; the timestamp index on each table turns the filter into a range scan.
+        deleted = 0
+        for model in (RouteSnapshot, BGPSnapshot, RouteDiff):
+            result = self.session.execute(
+                delete(model)
+                .where(model.timestamp < cutoff_date)
+                .execution_options(synchronize_session=False)
+            )
+            deleted += result.rowcount
         
         self.session.commit()
         
-        return rib_deleted + bgp_deleted + diff_deleted
+        return deleted
+    
+    def get_latest_collection_times(
+        self,
+        vrf: str = "default",
+        afi: str = "ipv4",
+        enabled_only: bool = False
+    ) -> Dict[str, Dict[str, datetime]]:
+        """Get {device_name: {table_type: latest timestamp}} for every device with snapshots."""
+        stmt = _Q_LATEST_TIMES_ENABLED if enabled_only else _Q_LATEST_TIMES
+        out: Dict[str, Dict[str, datetime]] = {}
+        for table_type, device_name, ts in self.session.execute(
+            stmt, {"vrf": vrf, "afi": afi}
+        ):
+            out.setdefault(device_name, {})[table_type] = ts
+        return out
     
     def get_available_tables(self, device_name: str) -> List[Tuple[str, str, str]]:
         """Get list of (table_type, vrf, afi) tuples available for a device."""
-        device = self.session.query(Device).filter_by(name=device_name).first()
-        if not device:
+        device_id = self._device_id(device_name)
+        if device_id is None:
             return []
         
-        tables = []
-        
-        # Get RIB tables
-        rib_tables = self.session.query(
-            RouteSnapshot.vrf,
-            RouteSnapshot.afi
-        ).filter(
-            RouteSnapshot.device_id == device.id
-        ).distinct().all()
-        
-        for vrf, afi in rib_tables:
-            tables.append(("rib", vrf, afi))
-        
-        # Get BGP tables
-        bgp_tables = self.session.query(
-            BGPSnapshot.vrf,
-            BGPSnapshot.afi
-        ).filter(
-            BGPSnapshot.device_id == device.id
-        ).distinct().all()
-        
-        for vrf, afi in bgp_tables:
-            tables.append(("bgp", vrf, afi))
-        
-        return tables
+        rows = self.session.execute(_Q_TABLES, {"did": device_id})
+        return [(table_type, vrf, afi) for table_type, vrf, afi in rows]
     
     def compute_and_save_diff(
         self,
@@ -312,38 +567,41 @@ class DatabaseStorage:
         vrf: str,
         afi: str,
         current_data: Dict[str, Any],
-        timestamp: Optional[datetime] = None
+        timestamp: Optional[datetime] = None,
+        content_hash: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """Compute diff against previous snapshot and save if changes exist."""
+        stmt = _Q_LATEST_HASH.get(table_type)
+        device_id = self._device_id(device_name)
+        if stmt is not None and device_id is not None:
+            # Unchanged tables are the common case; compare content hashes
+            # before loading the previous snapshot's data.
+            previous_hash = self.session.execute(
+                stmt, {"did": device_id, "vrf": vrf, "afi": afi}
+            ).scalar()
+            if previous_hash is not None:
+                content_hash = content_hash or snapshot_hash(current_data)
+                if previous_hash == content_hash:
+                    return None
+        
         previous_data = self.get_latest_snapshot(device_name, table_type, vrf, afi)
         
         if previous_data is None:
             # First snapshot, no diff to compute
             return None
         
-        # Simple dict-based diff
-        prev_keys = set(previous_data.keys())
-        curr_keys = set(current_data.keys())
-        
-        added = []
+        # Simple dict-based diff; changed routes reference both versions
+        # rather than copying the current entry to attach the previous one.
+        added = [route for key, route in current_data.items() if key not in previous_data]
         removed = []
         changed = []
         
-        # Find added routes
-        for key in curr_keys - prev_keys:
-            added.append(current_data[key])
-        
-        # Find removed routes
-        for key in prev_keys - curr_keys:
-            removed.append(previous_data[key])
-        
-        # Find changed routes
-        for key in prev_keys & curr_keys:
-            if previous_data[key] != current_data[key]:
-                changed_entry = current_data[key].copy() if isinstance(current_data[key], dict) else current_data[key]
-                if isinstance(changed_entry, dict):
-                    changed_entry['_previous'] = previous_data[key]
-                changed.append(changed_entry)
+        for key, previous in previous_data.items():
+            current = current_data.get(key)
+            if current is None:
+                removed.append(previous)
+            elif current != previous:
+                changed.append({"key": key, "previous": previous, "current": current})
         
         diff = {
             "added": added,
@@ -363,12 +621,54 @@ class DatabaseStorage:
         self.session.close()
 
 
-def migrate_from_file_storage(file_storage_path: str = "route_snaps") -> None:
-    """Migrate existing file-based snapshots to database."""
-    import os
-    import gzip
-    from pathlib import Path
+# Archived snapshot filename: <vrf>.<afi>.YYYYMMDDHHMMSS.json[.gz|.zst]
+_SNAPSHOT_NAME_RE = re.compile(
+    r"^(?P<vrf>[^.]+)\.(?P<afi>[^.]+)\.(?P<ts>\d{14})\.json(?:\.gz|\.zst)?$"
+)
+
+# Snapshots per bulk load during migration
+MIGRATION_BATCH_SIZE = 32
+
+
+def _load_snapshot_file(path: Path) -> Tuple[str, int, str]:
+    """Read one archived snapshot file (runs in a worker process).
+    
+    The file is parsed here only to validate it and derive the route count
+    and content hash; the decompressed JSON text is returned as-is so the
+    writer never holds the decoded snapshot alongside its serialized form.
+    """
+    raw = path.read_bytes()
+    if path.suffix == ".gz":
+        raw = gzip.decompress(raw)
+    elif path.suffix == ".zst":
+        import zstandard  # optional; only needed for zstd archives
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    data = orjson.loads(raw)
+    return raw.decode(), len(data), snapshot_hash(data)
+
+
+def _iter_loaded(pool: Executor, paths: List[Path], window: int) -> Iterator[Future]:
+    """Submit loads to the pool, keeping at most `window` in flight, and yield
+    their futures in submission order."""
+    pending: deque = deque()
+    for path in paths:
+        pending.append(pool.submit(_load_snapshot_file, path))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def migrate_from_file_storage(
+    file_storage_path: str = "route_snaps",
+    max_workers: Optional[int] = None
+) -> None:
+    """Migrate existing file-based snapshots to database.
     
+    Decompression and JSON parsing run in a process pool while this process
+    writes the parsed snapshots to the database in file order, in batches of
+    MIGRATION_BATCH_SIZE (COPY on PostgreSQL).
+    """
     storage = DatabaseStorage()
     base_path = Path(file_storage_path)
     
@@ -376,87 +676,83 @@ def migrate_from_file_storage(file_storage_path: str = "route_snaps") -> None:
         print(f"No existing storage found at {file_storage_path}")
         return
     
-    for device_dir in base_path.iterdir():
-        if not device_dir.is_dir():
-            continue
-        
-        device_name = device_dir.name
-        print(f"Migrating device: {device_name}")
-        
-        # Check if device exists in database
-        device = storage.session.query(Device).filter_by(name=device_name).first()
-        if not device:
-            print(f"  Device {device_name} not in database, skipping")
-            continue
-        
-        # Migrate RIB snapshots
-        rib_dir = device_dir / "rib"
-        if rib_dir.exists():
-            for snapshot_file in rib_dir.glob("*.json*"):
-                # Parse filename: <vrf>.<afi>.YYYYMMDDHHMMSS.json.gz or <vrf>.<afi>.latest.json
-                parts = snapshot_file.stem.split(".")
-                if len(parts) < 3:
-                    continue
-                
-                vrf = parts[0]
-                afi = parts[1]
-                
-                if "latest" in snapshot_file.name:
-                    continue  # Skip latest files, use archives
-                
-                # Parse timestamp
-                try:
-                    timestamp_str = parts[2]
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                except:
+    max_workers = max_workers or os.cpu_count() or 1
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for device_dir in base_path.iterdir():
+            if not device_dir.is_dir():
+                continue
+            
+            device_name = device_dir.name
+            print(f"Migrating device: {device_name}")
+            
+            # Check if device exists in database
+            device_id = storage._device_id(device_name)
+            if device_id is None:
+                print(f"  Device {device_name} not in database, skipping")
+                continue
+            
+            jobs = []
+            for table_type in ("rib", "bgp"):
+                table_dir = device_dir / table_type
+                if not table_dir.exists():
                     continue
-                
-                # Load data
-                try:
-                    if snapshot_file.suffix == ".gz":
-                        with gzip.open(snapshot_file, "rt") as f:
-                            data = json.load(f)
-                    else:
-                        with open(snapshot_file, "r") as f:
-                            data = json.load(f)
+                for snapshot_file in table_dir.glob("*.json*"):
+                    # Parse filename: <vrf>.<afi>.YYYYMMDDHHMMSS.json.gz (or .json.zst)
+                    # (latest files don't match; archives are used instead)
+                    m = _SNAPSHOT_NAME_RE.match(snapshot_file.name)
+                    if not m:
+                        continue
+                    vrf, afi, ts = m.group("vrf", "afi", "ts")
+                    try:
+                        timestamp = datetime(
+                            int(ts[0:4]), int(ts[4:6]), int(ts[6:8]),
+                            int(ts[8:10]), int(ts[10:12]), int(ts[12:14])
+                        )
+                    except ValueError:
+                        continue
                     
-                    storage.save_snapshot(device_name, "rib", vrf, afi, data, timestamp)
-                    print(f"  Migrated RIB snapshot: {vrf}.{afi} @ {timestamp}")
-                except Exception as e:
-                    print(f"  Error migrating {snapshot_file}: {e}")
-        
-        # Migrate BGP snapshots
-        bgp_dir = device_dir / "bgp"
-        if bgp_dir.exists():
-            for snapshot_file in bgp_dir.glob("*.json*"):
-                parts = snapshot_file.stem.split(".")
-                if len(parts) < 3:
-                    continue
-                
-                vrf = parts[0]
-                afi = parts[1]
-                
-                if "latest" in snapshot_file.name:
-                    continue
-                
+                    jobs.append((table_type, vrf, afi, timestamp, snapshot_file))
+            
+            batches: Dict[str, List[Tuple]] = {"rib": [], "bgp": []}
+            
+            def flush(table_type: str) -> None:
+                batch = batches[table_type]
+                if not batch:
+                    return
                 try:
-                    timestamp_str = parts[2]
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                except:
-                    continue
-                
+                    storage.copy_snapshots_json(table_type, batch)
+                    migrated = batch
+                except Exception:
+                    # One bad row fails the whole batch; retry row by row so
+                    # only the rows that fail on their own are lost.
+                    migrated = []
+                    for row in batch:
+                        _, vrf, afi, timestamp, *_ = row
+                        try:
+                            storage.copy_snapshots_json(table_type, [row])
+                            migrated.append(row)
+                        except Exception as e:
+                            print(f"  Error migrating {table_type.upper()} snapshot {vrf}.{afi} @ {timestamp}: {e}")
+                for _, vrf, afi, timestamp, *_ in migrated:
+                    print(f"  Migrated {table_type.upper()} snapshot: {vrf}.{afi} @ {timestamp}")
+                batch.clear()
+            
+            loaded = _iter_loaded(pool, [job[4] for job in jobs], window=2 * max_workers)
+            for (table_type, vrf, afi, timestamp, snapshot_file), future in zip(jobs, loaded):
                 try:
-                    if snapshot_file.suffix == ".gz":
-                        with gzip.open(snapshot_file, "rt") as f:
-                            data = json.load(f)
-                    else:
-                        with open(snapshot_file, "r") as f:
-                            data = json.load(f)
-                    
-                    storage.save_snapshot(device_name, "bgp", vrf, afi, data, timestamp)
-                    print(f"  Migrated BGP snapshot: {vrf}.{afi} @ {timestamp}")
+                    raw, route_count, content_hash = future.result()
                 except Exception as e:
                     print(f"  Error migrating {snapshot_file}: {e}")
+                    continue
+                batches[table_type].append(
+                    (device_id, vrf, afi, timestamp, raw, route_count, content_hash)
+                )
+                if len(batches[table_type]) >= MIGRATION_BATCH_SIZE:
+                    flush(table_type)
+            
+            for table_type in batches:
+                flush(table_type)
     
     storage.close()
-    print("Migration complete")
\ No newline at end of file
+    print("Migration complete")
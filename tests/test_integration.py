@@ -8,7 +8,6 @@ import tempfile
 import shutil
 import time
 from unittest.mock import patch, Mock, MagicMock
-from freezegun import freeze_time
 
 # Import our modules
 from models import RIBEntry, BGPEntry, NH, AFI4, AFI6
@@ -17,6 +16,19 @@ from diffing import rib_diff, bgp_diff
 from poller import collect_and_persist_for_device
 
 
+@pytest.fixture(scope="module")
+def dev():
+    """Device config shared by the collection tests"""
+    return {
+        "name": "router1",
+        "device_type": "cisco_xe",
+        "host": "10.0.0.1",
+        "username": "admin",
+        "password": "password",
+        "vrfs": ["default"],
+        "afis": [AFI4]
+    }
+
 class TestEndToEndFlow:
     """Test the complete flow from collection to persistence to diffing"""
     
@@ -35,7 +47,7 @@ class TestEndToEndFlow:
             os.environ.pop("SNAPDIR", None)
     
     @patch('parsers.ConnectHandler')
-    def test_first_collection(self, mock_connect_handler):
+    def test_first_collection(self, mock_connect_handler, dev):
         """Test first collection with no previous data"""
         mock_conn = MagicMock()
         mock_connect_handler.return_value = mock_conn
@@ -89,25 +101,12 @@ class TestEndToEndFlow:
         }
         
         import ujson as json
-        # Mock responses - _try_json will append " | json" to commands
-        def mock_send_command(cmd, **kwargs):
-            if "show ip route" in cmd and "| json" in cmd:
-                return json.dumps(rib_response)
-            elif "show bgp" in cmd and "| json" in cmd:
-                return json.dumps(bgp_response)
-            return "{}"
-        
-        mock_conn.send_command.side_effect = mock_send_command
-        
-        dev = {
-            "name": "router1",
-            "device_type": "cisco_xe",
-            "host": "10.0.0.1",
-            "username": "admin",
-            "password": "password",
-            "vrfs": ["default"],
-            "afis": [AFI4]
+        # Mock responses keyed by exact command - _try_json appends " | json"
+        responses = {
+            "show ip route vrf default | json": json.dumps(rib_response),
+            "show bgp vrf default ipv4 unicast | json": json.dumps(bgp_response),
         }
+        mock_conn.send_command.side_effect = lambda cmd, **kwargs: responses.get(cmd, "{}")
         
         report = collect_and_persist_for_device(dev)
         
@@ -141,7 +140,7 @@ class TestEndToEndFlow:
         assert rib_data[0]["prefix"] == "10.0.0.0/24"
     
     @patch('parsers.ConnectHandler')
-    def test_incremental_changes(self, mock_connect_handler):
+    def test_incremental_changes(self, mock_connect_handler, dev):
         """Test detecting changes between collections"""
         mock_conn = MagicMock()
         mock_connect_handler.return_value = mock_conn
@@ -197,29 +196,19 @@ class TestEndToEndFlow:
         
         import ujson as json
         
-        dev = {
-            "name": "router1",
-            "device_type": "cisco_xe",
-            "host": "10.0.0.1",
-            "username": "admin",
-            "password": "password",
-            "vrfs": ["default"],
-            "afis": [AFI4]
-        }
-        
         # First collection
-        mock_conn.send_command.side_effect = [
+        mock_conn.send_command.side_effect = iter([
             json.dumps(initial_rib),
             json.dumps({"vrf": {"default": {"address_family": {"ipv4 unicast": {"routes": {}}}}}})
-        ]
+        ])
         
         report1 = collect_and_persist_for_device(dev)
         
         # Second collection with changes
-        mock_conn.send_command.side_effect = [
+        mock_conn.send_command.side_effect = iter([
             json.dumps(changed_rib),
             json.dumps({"vrf": {"default": {"address_family": {"ipv4 unicast": {"routes": {}}}}}})
-        ]
+        ])
         
         report2 = collect_and_persist_for_device(dev)
         
@@ -272,12 +261,12 @@ class TestMetricsExporter:
         
         # Mock snapshot reading
         with patch('exporter.read_latest') as mock_read:
-            mock_read.side_effect = [
+            mock_read.side_effect = iter([
                 # RIB snapshot
                 [{"prefix": "10.0.0.0/24", "protocol": "ospf"}],
                 # BGP snapshot
                 [{"prefix": "10.0.0.0/8", "best": True}, {"prefix": "192.168.0.0/16", "best": False}]
-            ]
+            ])
             
             update_metrics(report)
         
@@ -289,20 +278,10 @@ class TestErrorHandling:
     """Test error handling and recovery"""
     
     @patch('parsers.ConnectHandler')
-    def test_device_connection_failure(self, mock_connect_handler):
+    def test_device_connection_failure(self, mock_connect_handler, dev):
         """Test handling of device connection failures"""
         mock_connect_handler.side_effect = Exception("Connection refused")
         
-        dev = {
-            "name": "router1",
-            "device_type": "cisco_xe",
-            "host": "10.0.0.1",
-            "username": "admin",
-            "password": "password",
-            "vrfs": ["default"],
-            "afis": [AFI4]
-        }
-        
         # Should handle exception gracefully
         with pytest.raises(Exception):
             from parsers import collect_device_tables
@@ -322,6 +301,27 @@ class TestErrorHandling:
             with pytest.raises(Exception):
                 read_latest(bad_path)
 
+class TestUnchangedSnapshotSkip:
+    """The poller skips diffing when the stored hash matches the new snapshot"""
+
+    def test_hash_skip(self, tmp_path):
+        from poller import diff_against_latest
+        from storage import encode_snapshot
+
+        latest = str(tmp_path / "default.ipv4.latest.json")
+        curr = [{"prefix": "10.0.0.0/24"}]
+        raw = encode_snapshot(curr)
+        diff_fn = Mock(return_value={"adds": curr, "rems": [], "chgs": []})
+
+        assert diff_against_latest(latest, curr, raw, diff_fn)["adds"] == curr
+        assert diff_against_latest(latest, curr, raw, diff_fn) == {"adds": [], "rems": [], "chgs": []}
+        diff_fn.assert_called_once()
+
+        # Rewritten without a hash: the stale hash must not skip the next diff
+        write_latest(latest, [{"prefix": "10.9.0.0/16"}])
+        diff_against_latest(latest, curr, raw, diff_fn)
+        assert diff_fn.call_count == 2
+
 class TestPerformanceOptimization:
     """Test performance-critical code paths"""
     
@@ -44,6 +44,11 @@ class TestCommunityNormalization:
             "65001:100", "65002:200", "65003:300"
         ]
     
+    def test_list_elements_split_on_any_whitespace(self):
+        assert normalize_communities(["65001:100\t65002:200", "65003:300\n", ""]) == [
+            "65001:100", "65002:200", "65003:300"
+        ]
+    
     def test_duplicate_communities(self):
         assert normalize_communities("65001:100 65001:100 65002:200") == ["65001:100", "65002:200"]
     
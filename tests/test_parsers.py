@@ -3,9 +3,11 @@ Test suite for parsers.py - RIB and BGP parsing with multiple vendor formats
 """
 
 import pytest
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, MagicMock
 from parsers import (
-    _try_json, _nxapi_request, _parse_with_genie,
+    _try_json, _nxapi_request, _nxapi_request_all, _nxapi_fetch_all, _parse_with_genie,
+    NXAPI_TIMEOUT,
     fetch_parsed, parse_rib, parse_bgp, collect_device_tables
 )
 from models import AFI4, AFI6
@@ -36,13 +38,27 @@ class TestJSONParsing:
         result = _try_json(mock_conn, "show version")
         assert result is None
 
+class TestGenieParsing:
+    @patch('parsers.GenieDevice')
+    def test_parse_with_genie_reuses_identical_output(self, mock_device):
+        """Identical raw output is parsed by Genie only once"""
+        mock_device.return_value.parse.return_value = {"vrf": {}}
+        raw = "genie cache test output"
+        
+        first = _parse_with_genie("r1", "iosxe", "show ip route vrf default", raw)
+        second = _parse_with_genie("r2", "iosxe", "show ip route vrf default", raw)
+        assert first == second == {"vrf": {}}
+        mock_device.return_value.parse.assert_called_once()
+        
+        _parse_with_genie("r1", "iosxe", "show ip route vrf default", raw + " changed")
+        assert mock_device.return_value.parse.call_count == 2
+
 class TestNXAPIRequest:
-    @patch('parsers.requests.post')
+    @patch('parsers._NXAPI_SESSION.post')
     @patch.dict('os.environ', {'NXAPI_SCHEME': 'https', 'NXAPI_PORT': '443', 'NXAPI_VERIFY': 'false'})
     def test_nxapi_success(self, mock_post):
         """Test successful NX-API request"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        payload = {
             "ins_api": {
                 "outputs": {
                     "output": [
@@ -51,6 +67,7 @@ class TestNXAPIRequest:
                 }
             }
         }
+        mock_response = SimpleNamespace(raise_for_status=lambda: None, json=lambda: payload)
         mock_post.return_value = mock_response
         
         result = _nxapi_request("10.0.0.1", "admin", "password", ["show ip route"])
@@ -62,7 +79,7 @@ class TestNXAPIRequest:
         assert call_args[1]["auth"] == ("admin", "password")
         assert call_args[1]["verify"] is False
     
-    @patch('parsers.requests.post')
+    @patch('parsers._NXAPI_SESSION.post')
     def test_nxapi_failure(self, mock_post):
         """Test NX-API request failure"""
         mock_post.side_effect = Exception("Connection failed")
@@ -70,6 +87,31 @@ class TestNXAPIRequest:
         result = _nxapi_request("10.0.0.1", "admin", "password", ["show ip route"])
         assert result is None
 
+    @patch('parsers._NXAPI_SESSION.post')
+    def test_nxapi_batch_timeout_scales(self, mock_post):
+        """A batched request gets the per-command timeout once per command"""
+        mock_post.side_effect = Exception("Connection failed")
+
+        _nxapi_request_all("10.0.0.1", "admin", "password", ["show ip route", "show bgp all", "show vrf"])
+        assert mock_post.call_args[1]["timeout"] == 3 * NXAPI_TIMEOUT
+
+    @patch('parsers._nxapi_request')
+    @patch('parsers._NXAPI_SESSION.post')
+    @patch.dict('os.environ', {'USE_NXAPI': 'true'})
+    def test_failed_batch_retries_per_command(self, mock_post, mock_request):
+        """When the batch fails, each command is retried over NX-API before SSH"""
+        mock_post.side_effect = Exception("Read timed out")
+        mock_request.return_value = {"TABLE_vrf": {"ROW_vrf": []}}
+        dev = {"host": "10.0.0.1", "username": "admin", "password": "password"}
+        conn = MagicMock()
+
+        prefetched = _nxapi_fetch_all(dev, ["show ip route", "show bgp all"])
+        result = fetch_parsed(conn, "router1", "nxos", "show bgp all", dev, prefetched)
+
+        assert result == {"TABLE_vrf": {"ROW_vrf": []}}
+        mock_request.assert_called_once_with("10.0.0.1", "admin", "password", ["show bgp all"])
+        conn.send_command.assert_not_called()
+
 class TestRIBParsing:
     def test_parse_rib_genie_format(self):
         """Test parsing Genie-style RIB output"""
@@ -329,12 +371,12 @@ class TestDeviceCollection:
         mock_connect_handler.return_value = mock_conn
         
         # Mock successful JSON responses
-        mock_conn.send_command.side_effect = [
+        mock_conn.send_command.side_effect = iter([
             '{"vrf": {"default": {"address_family": {"ipv4": {"routes": {}}}}}}',  # RIB IPv4
             '{"vrf": {"default": {"address_family": {"ipv4 unicast": {"routes": {}}}}}}',  # BGP IPv4
             '{"vrf": {"default": {"address_family": {"ipv6": {"routes": {}}}}}}',  # RIB IPv6
             '{"vrf": {"default": {"address_family": {"ipv6 unicast": {"routes": {}}}}}}'  # BGP IPv6
-        ]
+        ])
         
         dev = {
             "name": "router1",
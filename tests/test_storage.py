@@ -4,14 +4,13 @@ Test suite for storage.py - Snapshot persistence and loading
 
 import pytest
 import os
-import tempfile
-import shutil
 import gzip
-import ujson as json
+import orjson
 from freezegun import freeze_time
 from storage import (
     ensure_dir, device_root, table_dir, diffs_dir,
-    latest_path, ts_gz_path, write_latest, write_gz, read_latest
+    latest_path, ts_gz_path, ts_archive_path, write_latest, write_gz, write_archive, read_latest,
+    index_path, append_index, rebuild_index, read_hash
 )
 
 class TestStoragePaths:
@@ -34,14 +33,16 @@ class TestStoragePaths:
         path = ts_gz_path("/snap", "router1", "rib", "default", "ipv4")
         assert path == "/snap/router1/rib/default.ipv4.20240115103045.json.gz"
 
+    @freeze_time("2024-01-15 10:30:45", tz_offset=0)
+    def test_ts_archive_path_zst(self):
+        path = ts_archive_path("/snap", "router1", "bgp", "default", "ipv6", fmt="zst")
+        assert path == "/snap/router1/bgp/default.ipv6.20240115103045.json.zst"
+
 class TestStorageOperations:
-    def setup_method(self):
-        """Create a temporary directory for testing"""
-        self.tmpdir = tempfile.mkdtemp()
-    
-    def teardown_method(self):
-        """Clean up temporary directory"""
-        shutil.rmtree(self.tmpdir)
+    @pytest.fixture(autouse=True)
+    def _tmpdir(self, tmp_path):
+        """Each test writes under its own pytest-managed temporary directory"""
+        self.tmpdir = str(tmp_path)
     
     def test_ensure_dir(self):
         test_dir = os.path.join(self.tmpdir, "test", "nested", "dir")
@@ -97,6 +98,14 @@ class TestStorageOperations:
         # Temp file should not exist
         assert not os.path.exists(test_path + ".tmp")
     
+    def test_write_latest_drops_stale_hash(self):
+        test_path = os.path.join(self.tmpdir, "default.ipv4.latest.json")
+        write_latest(test_path, {"version": 1}, content_hash="abc")
+        assert read_hash(test_path) == "abc"
+
+        write_latest(test_path, {"version": 2})
+        assert read_hash(test_path) is None
+    
     def test_write_gz(self):
         test_path = os.path.join(self.tmpdir, "test.json.gz")
         test_data = {
@@ -109,12 +118,21 @@ class TestStorageOperations:
         
         write_gz(test_path, test_data)
         assert os.path.exists(test_path)
+        assert not os.path.exists(test_path + ".tmp")
         
         # Read and verify gzipped data
-        with gzip.open(test_path, "rt") as f:
-            read_data = json.load(f)
+        with gzip.open(test_path, "rb") as f:
+            read_data = orjson.loads(f.read())
         assert read_data == test_data
     
+    def test_write_gz_failure_removes_tmp(self):
+        """A write that fails mid-way leaves neither the archive nor its temp file"""
+        test_path = os.path.join(self.tmpdir, "test.json.gz")
+        with pytest.raises(TypeError):
+            write_gz(test_path, {"unserializable": object()})
+        assert not os.path.exists(test_path)
+        assert not os.path.exists(test_path + ".tmp")
+    
     def test_write_gz_creates_parent_dirs(self):
         test_path = os.path.join(self.tmpdir, "deep", "nested", "test.json.gz")
         test_data = {"test": "data"}
@@ -122,6 +140,52 @@ class TestStorageOperations:
         write_gz(test_path, test_data)
         assert os.path.exists(test_path)
     
+    def test_write_archive_zst(self):
+        zstandard = pytest.importorskip("zstandard")
+        test_path = os.path.join(self.tmpdir, "test.json.zst")
+        test_data = [{"prefix": "10.0.0.0/8", "protocol": "bgp"}]
+
+        write_archive(test_path, test_data)
+        assert not os.path.exists(test_path + ".tmp")
+
+        with open(test_path, "rb") as f:
+            raw = zstandard.ZstdDecompressor().decompressobj().decompress(f.read())
+        assert orjson.loads(raw) == test_data
+    
+    def test_append_index(self):
+        """First append indexes existing archives; later ones add a line each"""
+        old = os.path.join(table_dir(self.tmpdir, "r1", "rib"), "default.ipv4.20240101000000.json.gz")
+        write_gz(old, [])
+        append_index(self.tmpdir, "r1", [("rib", old)])
+
+        new = os.path.join(diffs_dir(self.tmpdir, "r1"), "default.ipv4.20240102000000.json.gz")
+        write_gz(new, {})
+        append_index(self.tmpdir, "r1", [("diff", new)])
+
+        with open(index_path(self.tmpdir, "r1"), "rb") as f:
+            recs = [orjson.loads(line) for line in f]
+        assert [(r["table"], r["ts"]) for r in recs] == [("rib", "20240101000000"), ("diff", "20240102000000")]
+        assert recs[0]["size"] == os.path.getsize(old)
+
+    def test_append_index_short_writes(self, monkeypatch):
+        """Partial os.write calls are continued, never left as a torn line"""
+        ensure_dir(device_root(self.tmpdir, "r1"))
+        rebuild_index(self.tmpdir, "r1")
+        archives = []
+        for day in (1, 2, 3):
+            p = os.path.join(table_dir(self.tmpdir, "r1", "bgp"), f"default.ipv6.2024010{day}000000.json.gz")
+            write_gz(p, [])
+            archives.append(("bgp", p))
+
+        real_write = os.write
+        monkeypatch.setattr(os, "write", lambda fd, buf: real_write(fd, bytes(buf[:7])))
+        append_index(self.tmpdir, "r1", archives)
+        monkeypatch.undo()
+
+        with open(index_path(self.tmpdir, "r1"), "rb") as f:
+            recs = [orjson.loads(line) for line in f]
+        assert [r["ts"] for r in recs] == ["20240101000000", "20240102000000", "20240103000000"]
+
     def test_read_latest_nonexistent(self):
         """Test reading a non-existent file returns None"""
         test_path = os.path.join(self.tmpdir, "nonexistent.json")
@@ -0,0 +1,200 @@
+"""
+Test suite for storage_db.py - Database snapshot and diff persistence
+"""
+
+import pytest
+import gzip
+import orjson
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, null, select
+
+from database import BGPSnapshot, RouteDiff, RouteSnapshot, get_session
+from device_manager import DeviceManager
+from storage import snapshot_hash
+from storage_db import DatabaseStorage, migrate_from_file_storage
+
+try:
+    import zstandard
+except ImportError:  # optional; the zst test is skipped without it
+    zstandard = None
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """DatabaseStorage on a fresh SQLite database with one device"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'routes.db'}")
+    session = get_session()
+    DeviceManager(session).add_device("router1", "10.0.0.1", "cisco_xe", "admin", "password")
+    storage = DatabaseStorage(session)
+    yield storage
+    storage.close()
+
+
+def save_poll(storage, ts, n_added=1):
+    """Save the rib and bgp diffs of one poll; they share its timestamp"""
+    for table_type in ("rib", "bgp"):
+        storage.save_diff(
+            "router1", table_type, "default", "ipv4",
+            {"added": [{"prefix": f"10.{i}.0.0/16"} for i in range(n_added)], "removed": [], "changed": []},
+            timestamp=ts
+        )
+
+
+class TestDiffPaging:
+    def test_page_boundary_inside_timestamp_tie(self, storage):
+        """A page ending between a poll's rib and bgp diffs must not drop the second one"""
+        t0 = datetime(2024, 1, 15, 10, 0, 0)
+        for i in range(3):
+            save_poll(storage, t0 + timedelta(minutes=i))
+
+        seen = []
+        page = storage.get_diffs("router1", "default", "ipv4", limit=3)
+        while page:
+            seen.extend(page)
+            last = page[-1]
+            page = storage.get_diffs(
+                "router1", "default", "ipv4", limit=3,
+                before=datetime.fromisoformat(last["timestamp"]), before_id=last["id"]
+            )
+
+        assert len(seen) == 6
+        assert len({d["id"] for d in seen}) == 6
+        keys = [(d["timestamp"], d["id"]) for d in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_summaries_page_like_diffs(self, storage):
+        t0 = datetime(2024, 1, 15, 10, 0, 0)
+        for i in range(2):
+            save_poll(storage, t0 + timedelta(minutes=i))
+
+        first = storage.get_diff_summaries("router1", "default", "ipv4", limit=1)
+        rest = storage.get_diff_summaries(
+            "router1", "default", "ipv4", limit=10,
+            before=datetime.fromisoformat(first[0]["timestamp"]), before_id=first[0]["id"]
+        )
+        full = storage.get_diffs("router1", "default", "ipv4", limit=10)
+        assert [d["id"] for d in first + rest] == [d["id"] for d in full]
+
+    def test_before_without_id_is_strictly_older(self, storage):
+        t0 = datetime(2024, 1, 15, 10, 0, 0)
+        save_poll(storage, t0)
+        save_poll(storage, t0 + timedelta(minutes=1))
+
+        older = storage.get_diffs("router1", "default", "ipv4", before=t0 + timedelta(minutes=1))
+        assert {d["timestamp"] for d in older} == {t0.isoformat()}
+        assert len(older) == 2
+
+
+class TestDiffSummaries:
+    def test_counts_match_diff_lengths(self, storage):
+        ts = datetime(2024, 1, 15, 10, 0, 0)
+        storage.save_diff(
+            "router1", "rib", "default", "ipv4",
+            {
+                "added": [{"prefix": "10.0.0.0/8"}, {"prefix": "10.1.0.0/16"}],
+                "removed": [{"prefix": "192.0.2.0/24"}],
+                "changed": [],
+            },
+            timestamp=ts
+        )
+
+        [summary] = storage.get_diff_summaries("router1", "default", "ipv4")
+        assert summary["table_type"] == "rib"
+        assert summary["timestamp"] == ts.isoformat()
+        assert (summary["added"], summary["removed"], summary["changed"]) == (2, 1, 0)
+
+    def test_missing_arrays_count_as_zero(self, storage):
+        """coalesce() turns a NULL diff column into a count of 0"""
+        storage.session.execute(insert(RouteDiff).values(
+            device_id=storage._device_id("router1"), vrf="default", afi="ipv4", table_type="bgp",
+            timestamp=datetime(2024, 1, 15, 10, 0, 0), added=null(), removed=null(), changed=null()
+        ))
+        storage.session.commit()
+
+        [summary] = storage.get_diff_summaries("router1", "default", "ipv4", table_type="bgp")
+        assert (summary["added"], summary["removed"], summary["changed"]) == (0, 0, 0)
+
+    def test_unknown_device(self, storage):
+        assert storage.get_diff_summaries("nope", "default", "ipv4") == []
+
+
+class TestChangedShape:
+    def test_old_rows_normalized(self, storage):
+        """Rows from before the {key, previous, current} format read back in that format"""
+        ts = datetime(2024, 1, 15, 10, 0, 0)
+        prev = {"prefix": "10.0.0.0/24", "metric": 10}
+        curr = {"prefix": "10.0.0.0/24", "metric": 20}
+        storage.save_diff("router1", "rib", "default", "ipv4",
+                          {"added": [], "removed": [], "changed": [{**curr, "_previous": prev}]}, timestamp=ts)
+
+        expected = [{"key": "10.0.0.0/24", "previous": prev, "current": curr}]
+        assert storage.get_diffs("router1", "default", "ipv4")[0]["changed"] == expected
+        assert storage.get_diff_at_time("router1", "rib", "default", "ipv4", ts)["changed"] == expected
+
+    def test_new_rows_unchanged(self, storage):
+        storage.save_snapshot("router1", "rib", "default", "ipv4", {"10.0.0.0/24": {"prefix": "10.0.0.0/24", "metric": 10}})
+        diff = storage.compute_and_save_diff(
+            "router1", "rib", "default", "ipv4", {"10.0.0.0/24": {"prefix": "10.0.0.0/24", "metric": 20}}
+        )
+        assert diff["changed"] == [{
+            "key": "10.0.0.0/24",
+            "previous": {"prefix": "10.0.0.0/24", "metric": 10},
+            "current": {"prefix": "10.0.0.0/24", "metric": 20},
+        }]
+        assert storage.get_diffs("router1", "default", "ipv4")[0]["changed"] == diff["changed"]
+
+
+class TestMigration:
+    SNAPSHOT = {"10.0.0.0/24": {"prefix": "10.0.0.0/24", "protocol": "ospf", "metric": 20}}
+
+    def write_archive(self, root, table_type, ts, ext, data):
+        d = root / "router1" / table_type
+        d.mkdir(parents=True, exist_ok=True)
+        raw = orjson.dumps(data)
+        if ext == "gz":
+            raw = gzip.compress(raw)
+        else:
+            raw = zstandard.ZstdCompressor().compress(raw)
+        (d / f"default.ipv4.{ts}.json.{ext}").write_bytes(raw)
+
+    def migrated(self, storage, table_type):
+        model = RouteSnapshot if table_type == "rib" else BGPSnapshot
+        return storage.session.execute(
+            select(model.timestamp, model.route_count, model.content_hash).order_by(model.timestamp)
+        ).all()
+
+    def test_gz_archives(self, storage, tmp_path):
+        self.write_archive(tmp_path / "snaps", "rib", "20240115100000", "gz", self.SNAPSHOT)
+        migrate_from_file_storage(str(tmp_path / "snaps"), max_workers=1)
+
+        assert storage.get_latest_snapshot("router1", "rib", "default", "ipv4") == self.SNAPSHOT
+        [(ts, route_count, content_hash)] = self.migrated(storage, "rib")
+        assert ts == datetime(2024, 1, 15, 10, 0, 0)
+        assert route_count == 1
+        assert content_hash == snapshot_hash(self.SNAPSHOT)
+
+    def test_zst_archives(self, storage, tmp_path):
+        pytest.importorskip("zstandard")
+        self.write_archive(tmp_path / "snaps", "bgp", "20240115100000", "zst", self.SNAPSHOT)
+        migrate_from_file_storage(str(tmp_path / "snaps"), max_workers=1)
+
+        assert storage.get_latest_snapshot("router1", "bgp", "default", "ipv4") == self.SNAPSHOT
+        [(_, route_count, content_hash)] = self.migrated(storage, "bgp")
+        assert route_count == 1
+        assert content_hash == snapshot_hash(self.SNAPSHOT)
+
+    def test_failed_batch_keeps_good_rows(self, storage, tmp_path, monkeypatch):
+        """A bad row fails its batch; the batch is retried row by row and only that row is lost"""
+        for second in range(4):
+            self.write_archive(tmp_path / "snaps", "rib", f"2024011510000{second}", "gz", self.SNAPSHOT)
+        copy = DatabaseStorage.copy_snapshots_json
+
+        def copy_failing_on_second_2(self, table_type, rows):
+            if any(row[3].second == 2 for row in rows):
+                raise ValueError("bad row")
+            copy(self, table_type, rows)
+        monkeypatch.setattr(DatabaseStorage, "copy_snapshots_json", copy_failing_on_second_2)
+
+        migrate_from_file_storage(str(tmp_path / "snaps"), max_workers=1)
+        assert [ts.second for ts, _, _ in self.migrated(storage, "rib")] == [0, 1, 3]
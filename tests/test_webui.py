@@ -0,0 +1,124 @@
+"""
+Test suite for webui.py - File-backed web UI API
+"""
+
+import pytest
+import os
+import orjson
+
+from fastapi.testclient import TestClient
+
+import webui
+from storage import write_gz, write_latest, latest_path, table_dir, append_index, index_path
+
+
+@pytest.fixture
+def snapdir(tmp_path, monkeypatch):
+    """Point the web UI at an empty snapshot directory with cold caches"""
+    monkeypatch.setattr(webui, "SNAPDIR", str(tmp_path))
+    for fn in (webui.list_devices, webui._device_set, webui.scan_tables_for_device):
+        fn.cache_clear()
+    webui._read_index_cached.cache_clear()
+    return str(tmp_path)
+
+
+@pytest.fixture
+def client(snapdir):
+    return TestClient(webui.app)
+
+
+def write_archive(snapdir, table, ts, data):
+    path = os.path.join(table_dir(snapdir, "router1", table), f"default.ipv4.{ts}.json.gz")
+    write_gz(path, data)
+    return path
+
+
+class TestArchiveIndex:
+    def test_corrupt_line_skipped(self, client, snapdir):
+        """A torn line in index.jsonl drops that record, not the whole endpoint"""
+        write_latest(latest_path(snapdir, "router1", "rib", "default", "ipv4"), [])
+        append_index(snapdir, "router1", [("rib", write_archive(snapdir, "rib", "20240101000000", []))])
+        with open(index_path(snapdir, "router1"), "ab") as f:
+            f.write(b'{"table": "rib", "vrf": "defa\n')
+        append_index(snapdir, "router1", [("rib", write_archive(snapdir, "rib", "20240102000000", []))])
+
+        recs = webui.read_index("router1")
+        assert [r["ts"] for r in recs] == ["20240101000000", "20240102000000"]
+
+        resp = client.get("/api/devices/router1/tables")
+        assert resp.status_code == 200
+        assert orjson.loads(resp.content)["rib"] == [["default", "ipv4"]]
+
+
+class TestTTLCache:
+    def test_memoized_within_ttl(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(webui.time, "monotonic", lambda: now[0])
+        calls = []
+
+        @webui._ttl_cache(5)
+        def scan(device):
+            calls.append(device)
+            return len(calls)
+
+        assert scan("r1") == scan("r1") == 1
+        assert scan("r2") == 2
+        now[0] += 5
+        assert scan("r1") == 3
+        scan.cache_clear()
+        assert scan("r1") == 4
+
+    def test_zero_ttl_disables(self):
+        calls = []
+
+        @webui._ttl_cache(0)
+        def scan():
+            calls.append(1)
+
+        scan()
+        scan()
+        assert len(calls) == 2
+
+    def test_new_device_seen_after_clear(self, client, snapdir, monkeypatch):
+        monkeypatch.setattr(webui.time, "monotonic", lambda: 100.0)
+        assert orjson.loads(client.get("/api/devices").content) == {"devices": []}
+        os.makedirs(os.path.join(snapdir, "router1"))
+        # Directory listings are reused until the TTL expires
+        assert orjson.loads(client.get("/api/devices").content) == {"devices": []}
+        webui.list_devices.cache_clear()
+        assert orjson.loads(client.get("/api/devices").content) == {"devices": ["router1"]}
+
+
+class TestArchiveResponse:
+    @pytest.fixture
+    def archive(self, snapdir):
+        os.makedirs(os.path.join(snapdir, "router1"), exist_ok=True)
+        write_archive(snapdir, "rib", "20240101000000", [{"prefix": "10.0.0.0/24"}])
+        return "/api/devices/router1/history/20240101000000?table=rib&vrf=default&afi=ipv4"
+
+    def test_immutable_with_etag(self, client, archive):
+        resp = client.get(archive)
+        assert resp.status_code == 200
+        assert resp.headers["etag"].startswith('W/"')
+        assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.json() == [{"prefix": "10.0.0.0/24"}]
+
+    def test_not_modified(self, client, archive):
+        etag = client.get(archive).headers["etag"]
+        resp = client.get(archive, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == etag
+
+    def test_decoded_for_clients_without_gzip(self, client, archive):
+        resp = client.get(archive, headers={"Accept-Encoding": "identity"})
+        assert resp.status_code == 200
+        assert "content-encoding" not in resp.headers
+        assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert resp.json() == [{"prefix": "10.0.0.0/24"}]
+
+    def test_stale_etag_gets_body(self, client, archive):
+        resp = client.get(archive, headers={"If-None-Match": 'W/"0-0"'})
+        assert resp.status_code == 200
+        assert resp.json() == [{"prefix": "10.0.0.0/24"}]
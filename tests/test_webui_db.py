@@ -0,0 +1,226 @@
+"""
+Test suite for webui_db.py - Database-backed web API
+"""
+
+import pytest
+import orjson
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import webui_db
+from database import get_session
+from device_manager import DeviceManager
+from storage_db import DatabaseStorage
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API client on a fresh SQLite database with one device and an empty cache"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'routes.db'}")
+    session = get_session()
+    DeviceManager(session).add_device("router1", "10.0.0.1", "cisco_xe", "admin", "password")
+    session.close()
+    webui_db._invalidate_api_cache()
+    with TestClient(webui_db.app) as client:
+        yield client
+    webui_db._invalidate_api_cache()
+
+
+def save_snapshot(table="rib", ts=datetime(2024, 1, 15, 10, 0, 0)):
+    storage = DatabaseStorage()
+    storage.save_snapshot("router1", table, "default", "ipv4",
+                          {"10.0.0.0/24": {"prefix": "10.0.0.0/24"}}, timestamp=ts)
+    storage.close()
+
+
+class TestApiCache:
+    def test_unknown_device_tables_not_cached(self, client):
+        resp = client.get("/api/devices/nope/tables")
+        assert resp.status_code == 200
+        assert resp.json() == {"rib": [], "bgp": []}
+        assert ("tables", "nope") not in webui_db._api_cache
+
+    def test_tables_cached(self, client):
+        save_snapshot()
+        first = client.get("/api/devices/router1/tables").json()
+        assert first["rib"] == [{"vrf": "default", "afi": "ipv4"}]
+
+        # A snapshot for a new table is not seen until the entry expires
+        save_snapshot(table="bgp")
+        assert client.get("/api/devices/router1/tables").json() == first
+        webui_db._invalidate_api_cache()
+        assert client.get("/api/devices/router1/tables").json()["bgp"] == [{"vrf": "default", "afi": "ipv4"}]
+
+    def test_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(webui_db, "API_CACHE_SIZE", 3)
+        webui_db._invalidate_api_cache()
+        for i in range(5):
+            webui_db._cached(("k", i), 60, lambda: i)
+        assert list(webui_db._api_cache) == [("k", 2), ("k", 3), ("k", 4)]
+        webui_db._invalidate_api_cache()
+
+    def test_device_list_not_cached(self, client):
+        assert [d["name"] for d in client.get("/api/devices").json()] == ["router1"]
+        session = get_session()
+        DeviceManager(session).add_device("router2", "10.0.0.2", "cisco_xe", "admin", "password")
+        session.close()
+        assert [d["name"] for d in client.get("/api/devices").json()] == ["router1", "router2"]
+        assert client.get("/api/devices/router2").json()["hostname"] == "10.0.0.2"
+
+
+class TestSnapshotStreaming:
+    def test_latest_streams_all_routes(self, client, monkeypatch):
+        """Routes spanning several encode batches join into one valid JSON document"""
+        monkeypatch.setattr(webui_db, "STREAM_BATCH", 3)
+        routes = {f"10.0.{i}.0/24": {"prefix": f"10.0.{i}.0/24"} for i in range(7)}
+        storage = DatabaseStorage()
+        storage.save_snapshot("router1", "rib", "default", "ipv4", routes)
+        storage.close()
+
+        resp = client.get("/api/devices/router1/latest", params={"table": "rib", "vrf": "default", "afi": "ipv4"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/json"
+        body = resp.json()
+        assert body["device"] == "router1"
+        assert body["count"] == 7
+        assert sorted(r["prefix"] for r in body["routes"]) == sorted(routes)
+
+    @pytest.mark.parametrize("n", [0, 1, 3])
+    def test_stream_routes_batches(self, monkeypatch, n):
+        monkeypatch.setattr(webui_db, "STREAM_BATCH", 3)
+        routes = [{"i": i} for i in range(n)]
+        body = b"".join(webui_db._stream_routes({"device": "r1"}, routes))
+        assert orjson.loads(body) == {"device": "r1", "routes": routes, "count": n}
+
+
+class TestSnapshotETag:
+    PARAMS = {"table": "rib", "vrf": "default", "afi": "ipv4"}
+
+    def test_latest_revalidates(self, client):
+        save_snapshot()
+        resp = client.get("/api/devices/router1/latest", params=self.PARAMS)
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"] == "no-cache"
+        etag = resp.headers["etag"]
+
+        resp = client.get("/api/devices/router1/latest", params=self.PARAMS, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == etag
+
+    def test_not_modified_skips_load(self, client, monkeypatch):
+        save_snapshot()
+        etag = client.get("/api/devices/router1/latest", params=self.PARAMS).headers["etag"]
+
+        def fail(*args):
+            raise AssertionError("snapshot data loaded for a 304")
+        monkeypatch.setattr(DatabaseStorage, "get_snapshot_by_id", fail)
+        resp = client.get("/api/devices/router1/latest", params=self.PARAMS, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+    def test_new_snapshot_changes_etag(self, client):
+        save_snapshot()
+        etag = client.get("/api/devices/router1/latest", params=self.PARAMS).headers["etag"]
+        save_snapshot(ts=datetime(2024, 1, 15, 10, 5, 0))
+
+        resp = client.get("/api/devices/router1/latest", params=self.PARAMS, headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+
+    def test_historical_snapshot_immutable(self, client):
+        save_snapshot()
+        url = "/api/devices/router1/snapshot/2024-01-15T10:00:00"
+        resp = client.get(url, params=self.PARAMS)
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert resp.json()["count"] == 1
+
+        resp = client.get(url, params=self.PARAMS, headers={"If-None-Match": resp.headers["etag"]})
+        assert resp.status_code == 304
+
+    def test_missing_snapshot(self, client):
+        resp = client.get("/api/devices/router1/latest", params=self.PARAMS)
+        assert resp.status_code == 404
+
+
+class TestSingleFlight:
+    N = 8
+
+    def run_concurrently(self, monkeypatch, load):
+        """Call _single_flight from N threads while the first load is held open"""
+        waiting = threading.Semaphore(0)
+
+        class CountingFuture(Future):
+            def result(self, timeout=None):
+                waiting.release()
+                return super().result(timeout)
+        monkeypatch.setattr(webui_db, "Future", CountingFuture)
+
+        release = threading.Event()
+        calls = []
+
+        def held_load():
+            calls.append(1)
+            assert release.wait(5)
+            return load()
+
+        with ThreadPoolExecutor(self.N) as pool:
+            leader = pool.submit(webui_db._single_flight, ("rib", 1), held_load)
+            while ("rib", 1) not in webui_db._inflight:
+                time.sleep(0.001)
+            followers = [pool.submit(webui_db._single_flight, ("rib", 1), held_load) for _ in range(self.N - 1)]
+            for _ in followers:
+                assert waiting.acquire(timeout=5)
+            release.set()
+            futures = [leader] + followers
+            wait(futures, timeout=5)
+        return calls, futures
+
+    def test_one_load_serves_all_callers(self, monkeypatch):
+        data = {"10.0.0.0/24": {}}
+        calls, futures = self.run_concurrently(monkeypatch, lambda: data)
+        assert len(calls) == 1
+        assert all(f.result() is data for f in futures)
+        assert webui_db._inflight == {}
+
+    def test_exception_reaches_all_callers(self, monkeypatch):
+        def load():
+            raise RuntimeError("database gone")
+        calls, futures = self.run_concurrently(monkeypatch, load)
+        assert len(calls) == 1
+        for f in futures:
+            with pytest.raises(RuntimeError):
+                f.result()
+        assert webui_db._inflight == {}
+
+    def test_sequential_calls_reload(self):
+        calls = []
+        webui_db._single_flight(("rib", 2), lambda: calls.append(1))
+        webui_db._single_flight(("rib", 2), lambda: calls.append(1))
+        assert len(calls) == 2
+
+
+class TestDiffPages:
+    def test_next_cursor_crosses_timestamp_tie(self, client):
+        storage = DatabaseStorage()
+        for minute in range(2):
+            for table_type in ("rib", "bgp"):
+                storage.save_diff("router1", table_type, "default", "ipv4",
+                                  {"added": [{"prefix": "10.0.0.0/24"}], "removed": [], "changed": []},
+                                  timestamp=datetime(2024, 1, 15, 10, minute, 0))
+        storage.close()
+
+        params = {"vrf": "default", "afi": "ipv4", "limit": 3}
+        seen = []
+        while True:
+            page = client.get("/api/devices/router1/diffs", params=params).json()
+            seen.extend(page["items"])
+            if page["next"] is None:
+                break
+            params.update(page["next"])
+        assert len({d["id"] for d in seen}) == 4
+        assert all(d["summary"] == {"added": 1, "removed": 0, "changed": 0} for d in seen)
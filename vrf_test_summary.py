@@ -1,10 +1,59 @@
 #!/usr/bin/env python3
 """Display VRF route monitoring summary."""
 
+import contextlib
+import os
+import orjson
 import requests
 import json
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 API_BASE = "http://localhost:5000/api"
+# Cap on in-flight API requests; the pool size bounds concurrency like a semaphore would
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "8"))
+FETCH_TIMEOUT = 10.0
+
+def _print_protocols(rib):
+    """Route count per protocol with up to three sample prefixes each, in one pass."""
+    counts = Counter()
+    samples = defaultdict(list)
+    for route in rib:
+        proto = route['protocol']
+        counts[proto] += 1
+        if len(samples[proto]) < 3:
+            samples[proto].append(route['prefix'])
+    
+    for proto in sorted(counts):
+        print(f"  {proto}: {counts[proto]}")
+        for prefix in samples[proto]:
+            print(f"    - {prefix}")
+
+def _fetch_latest(session: requests.Session, device: str, keys):
+    """
+    Fetch /latest for every (table, vrf, afi) concurrently; the calls are
+    independent, so total wait is the slowest one rather than the sum.
+    Failed fetches map to their exception.
+    """
+    url = f"{API_BASE}/devices/{device}/latest?table={{}}&vrf={{}}&afi={{}}"
+    def get(key):
+        try:
+            resp = session.get(url.format(*key), timeout=FETCH_TIMEOUT)
+        except requests.RequestException as e:
+            return e
+        if resp.status_code != 200:
+            return requests.HTTPError(f"{resp.status_code} for {resp.url}", response=resp)
+        return orjson.loads(resp.content)
+    keys = list(dict.fromkeys(keys))
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        return dict(zip(keys, pool.map(get, keys)))
+
+def _result(latest, key):
+    data = latest[key]
+    if isinstance(data, Exception):
+        raise data
+    return data
 
 def show_vrf_summary():
     """Display comprehensive VRF monitoring summary."""
@@ -17,8 +66,14 @@ def show_vrf_summary():
     device = "sbx-nxos"
     vrf = "CUSTOMER_A"
     
+    # One keep-alive connection for every API call below
+    with contextlib.closing(requests.Session()) as session:
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS))
+        _print_summary(session, device, vrf)
+
+def _print_summary(session: requests.Session, device: str, vrf: str):
     # Get available tables
-    tables = requests.get(f"{API_BASE}/devices/{device}/tables").json()
+    tables = orjson.loads(session.get(f"{API_BASE}/devices/{device}/tables").content)
     
     print(f"Device: {device}")
     print(f"VRF: {vrf}")
@@ -28,19 +83,19 @@ def show_vrf_summary():
     print("Route Statistics:")
     print("-" * 40)
     
+    detail_keys = [(t, vrf, a) for t in ('rib', 'bgp') for a in ('ipv4', 'ipv6')]
+    stat_keys = [(t, vrf_name, afi) for t in ['rib', 'bgp'] for vrf_name, afi in tables.get(t, [])]
+    latest = _fetch_latest(session, device, stat_keys + detail_keys)
+    
     vrfs = {}
-    for table_type in ['rib', 'bgp']:
-        for vrf_afi in tables.get(table_type, []):
-            vrf_name, afi = vrf_afi
-            if vrf_name not in vrfs:
-                vrfs[vrf_name] = {'rib': {'ipv4': 0, 'ipv6': 0}, 'bgp': {'ipv4': 0, 'ipv6': 0}}
-            
-            # Get route count
-            try:
-                data = requests.get(f"{API_BASE}/devices/{device}/latest?table={table_type}&vrf={vrf_name}&afi={afi}").json()
-                vrfs[vrf_name][table_type][afi] = len(data)
-            except:
-                pass
+    for table_type, vrf_name, afi in stat_keys:
+        if vrf_name not in vrfs:
+            vrfs[vrf_name] = {'rib': {'ipv4': 0, 'ipv6': 0}, 'bgp': {'ipv4': 0, 'ipv6': 0}}
+        
+        # Get route count; tables that failed to fetch stay at 0
+        data = latest[(table_type, vrf_name, afi)]
+        if not isinstance(data, Exception):
+            vrfs[vrf_name][table_type][afi] = len(data)
     
     # Display per-VRF statistics
     for vrf_name in sorted(vrfs.keys()):
@@ -59,36 +114,18 @@ def show_vrf_summary():
     print("=" * 80)
     
     # IPv4 RIB
-    ipv4_rib = requests.get(f"{API_BASE}/devices/{device}/latest?table=rib&vrf={vrf}&afi=ipv4").json()
+    ipv4_rib = _result(latest, ('rib', vrf, 'ipv4'))
     print("\nIPv4 RIB Routes:")
-    protocols = {}
-    for route in ipv4_rib:
-        proto = route['protocol']
-        protocols[proto] = protocols.get(proto, 0) + 1
-    
-    for proto, count in sorted(protocols.items()):
-        print(f"  {proto}: {count}")
-        routes = [r for r in ipv4_rib if r['protocol'] == proto][:3]
-        for r in routes:
-            print(f"    - {r['prefix']}")
+    _print_protocols(ipv4_rib)
     
     # IPv6 RIB
-    ipv6_rib = requests.get(f"{API_BASE}/devices/{device}/latest?table=rib&vrf={vrf}&afi=ipv6").json()
+    ipv6_rib = _result(latest, ('rib', vrf, 'ipv6'))
     print("\nIPv6 RIB Routes:")
-    protocols = {}
-    for route in ipv6_rib:
-        proto = route['protocol']
-        protocols[proto] = protocols.get(proto, 0) + 1
-    
-    for proto, count in sorted(protocols.items()):
-        print(f"  {proto}: {count}")
-        routes = [r for r in ipv6_rib if r['protocol'] == proto][:3]
-        for r in routes:
-            print(f"    - {r['prefix']}")
+    _print_protocols(ipv6_rib)
     
     # BGP routes
-    ipv4_bgp = requests.get(f"{API_BASE}/devices/{device}/latest?table=bgp&vrf={vrf}&afi=ipv4").json()
-    ipv6_bgp = requests.get(f"{API_BASE}/devices/{device}/latest?table=bgp&vrf={vrf}&afi=ipv6").json()
+    ipv4_bgp = _result(latest, ('bgp', vrf, 'ipv4'))
+    ipv6_bgp = _result(latest, ('bgp', vrf, 'ipv6'))
     
     print("\nBGP Routes:")
     print(f"  IPv4: {len(ipv4_bgp)} prefixes")
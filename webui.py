@@ -1,64 +1,149 @@
+import heapq
 import os
 import re
-import json
-import gzip
+import time
+import zlib
+from functools import lru_cache, wraps
+from operator import itemgetter
 from typing import List, Dict, Any, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+import orjson
 
-from storage import device_root, table_dir, latest_path
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, Response
+
+from orjson_response import OrjsonResponse
+from static_cache import mount_cached_static
+from storage import device_root, table_dir, latest_path, index_path
 
 APP_TITLE = "Routing Table & BGP RIB Change Tracker UI"
 SNAPDIR = os.environ.get("SNAPDIR", "./route_snaps")
+# Directory listings are reused for this many seconds; new devices/tables show up within it
+SCAN_CACHE_TTL = float(os.environ.get("SCAN_CACHE_TTL", "5"))
 
-app = FastAPI(title=APP_TITLE)
+READ_CHUNK = 1 << 20
 
+_TABLE_FILE_PAT = re.compile(r"^(?P<vrf>[^.]+)\.(?P<afi>ipv4|ipv6)\.(latest\.json|\d{14}\.json\.(?:gz|zst))$")
+_DIFF_FILE_PAT = re.compile(r"^(?P<vrf>[^.]+)\.(?P<afi>ipv4|ipv6)\.(?P<ts>\d{14})\.json\.gz$")
 
-def _exists(path: str) -> bool:
-    return os.path.exists(path)
+app = FastAPI(title=APP_TITLE, default_response_class=OrjsonResponse)
+# Decoded archives and snapshots are repetitive JSON; stored .gz files sent
+# with Content-Encoding: gzip pass through untouched
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 
-def _isdir(path: str) -> bool:
-    return os.path.isdir(path)
+def _exists(path: str) -> bool:
+    return os.path.exists(path)
 
 
+def _ttl_cache(seconds: float):
+    """
+    Memoize a function of hashable args for `seconds`, keyed by a time bucket.
+    Cached values are shared between callers and must not be mutated.
+    """
+    def decorator(fn):
+        cache: Dict[Tuple, Tuple[int, Any]] = {}
+
+        @wraps(fn)
+        def wrapper(*args):
+            if seconds <= 0:
+                return fn(*args)
+            bucket = int(time.monotonic() / seconds)
+            hit = cache.get(args)
+            if hit is not None and hit[0] == bucket:
+                return hit[1]
+            value = fn(*args)
+            cache[args] = (bucket, value)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+@_ttl_cache(SCAN_CACHE_TTL)
 def list_devices() -> List[str]:
     if not _exists(SNAPDIR):
         return []
-    devices = []
-    for name in os.listdir(SNAPDIR):
-        p = os.path.join(SNAPDIR, name)
-        if _isdir(p):
-            devices.append(name)
+    with os.scandir(SNAPDIR) as it:
+        devices = [e.name for e in it if e.is_dir()]
     devices.sort()
     return devices
 
 
-def _list_files(path: str, pattern: Optional[re.Pattern] = None) -> List[str]:
+@_ttl_cache(SCAN_CACHE_TTL)
+def _device_set() -> frozenset:
+    """list_devices() as a set, for the per-request "device exists" checks."""
+    return frozenset(list_devices())
+
+
+def _list_files(path: str, pattern: Optional[re.Pattern] = None) -> List[os.DirEntry]:
+    """
+    Regular files in path whose name matches pattern. scandir entries carry the
+    file type from the directory read, so no per-file stat is needed to filter.
+    """
     if not _exists(path):
         return []
-    files = []
-    for name in os.listdir(path):
-        fp = os.path.join(path, name)
-        if os.path.isfile(fp):
-            if pattern is None or pattern.match(name):
-                files.append(name)
-    return files
+    with os.scandir(path) as it:
+        return [e for e in it if e.is_file() and (pattern is None or pattern.match(e.name))]
+
+
+def _entry_size(entry: os.DirEntry) -> int:
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return 0
 
 
+def read_index(device: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Archive records from the device's index.jsonl (see storage.append_index), or None
+    when the poller has not written one yet. Cached by (mtime, size); do not mutate.
+    """
+    ip = index_path(SNAPDIR, device)
+    try:
+        st = os.stat(ip)
+    except FileNotFoundError:
+        return None
+    return _read_index_cached(ip, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=64)
+def _read_index_cached(path: str, mtime_ns: int, size: int) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\n")
+    # The last piece is empty, or a line still being appended. A torn or corrupt
+    # line elsewhere is skipped rather than failing every index-backed endpoint.
+    records = []
+    for line in lines[:-1]:
+        try:
+            records.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            continue
+    return records
+
+
+@_ttl_cache(SCAN_CACHE_TTL)
 def scan_tables_for_device(device: str) -> Dict[str, List[Tuple[str, str]]]:
     """
     Return available (vrf, afi) pairs for rib and bgp based on files present.
     """
+    index = read_index(device)
+    if index is not None:
+        seen = {"rib": set(), "bgp": set()}
+        for rec in index:
+            pairs = seen.get(rec["table"])
+            if pairs is not None:
+                pairs.add((rec["vrf"], rec["afi"]))
+        return {table: sorted(pairs) for table, pairs in seen.items()}
     out = {"rib": [], "bgp": []}
-    pat = re.compile(r"^(?P<vrf>[^.]+)\.(?P<afi>ipv4|ipv6)\.(latest\.json|\d{14}\.json\.gz)$")
+    pat = _TABLE_FILE_PAT
     for table in ("rib", "bgp"):
         td = table_dir(SNAPDIR, device, table)
         seen = set()
-        for name in _list_files(td, pat):
-            m = pat.match(name)
+        for entry in _list_files(td, pat):
+            m = pat.match(entry.name)
             if not m:
                 continue
             vrf = m.group("vrf")
@@ -68,51 +153,126 @@ def scan_tables_for_device(device: str) -> Dict[str, List[Tuple[str, str]]]:
     return out
 
 
+@lru_cache(maxsize=256)
+def _history_pat(vrf: str, afi: str) -> re.Pattern:
+    return re.compile(rf"^{re.escape(vrf)}\.{re.escape(afi)}\.(\d{{14}})\.json\.(?:gz|zst)$")
+
+
 def read_json(path: str) -> Any:
-    if not _exists(path):
-        raise FileNotFoundError(path)
+    """
+    Parsed contents of a snapshot/diff file. Results are cached by (path, mtime, size),
+    so repeat reads of unchanged files skip the decompress + parse; do not mutate them.
+    """
+    st = os.stat(path)
+    return _read_json_cached(path, st.st_mtime_ns, st.st_size)
+
+
+def _gunzip_file(path: str) -> bytearray:
+    """Decompress a gzip file chunk by chunk, so the compressed copy is never held whole."""
+    d = zlib.decompressobj(wbits=31)
+    out = bytearray()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            out += d.decompress(chunk)
+            while d.eof and d.unused_data:  # concatenated gzip members
+                rest = d.unused_data
+                d = zlib.decompressobj(wbits=31)
+                out += d.decompress(rest)
+    out += d.flush()
+    return out
+
+
+@lru_cache(maxsize=128)
+def _read_json_cached(path: str, mtime_ns: int, size: int) -> Any:
     if path.endswith(".gz"):
-        with gzip.open(path, "rt") as f:
-            return json.load(f)
-    with open(path, "r") as f:
-        return json.load(f)
+        return orjson.loads(_gunzip_file(path))
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".zst"):
+        import zstandard  # optional; only needed for zstd archives
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return orjson.loads(raw)
+
+
+def json_file_response(request: Request, path: str, what: str):
+    """
+    Serve a stored JSON file without parsing and re-encoding it: plain .json as-is,
+    .json.gz as-is with Content-Encoding: gzip when the client accepts gzip.
+    Anything else is decoded and re-serialized.
+    """
+    if path.endswith(".json"):
+        return FileResponse(path, media_type="application/json")
+    if path.endswith(".gz") and "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(path, media_type="application/json",
+                            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    try:
+        data = read_json(path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read {what}: {e}")
+    return data
+
+
+def archive_response(request: Request, path: str, what: str):
+    """
+    json_file_response for timestamped archives, which never change once written:
+    clients may cache them indefinitely and revalidate with If-None-Match.
+    """
+    st = os.stat(path)
+    etag = f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    resp = json_file_response(request, path, what)
+    if not isinstance(resp, Response):
+        resp = OrjsonResponse(resp)
+    resp.headers.update(headers)
+    return resp
 
 
 def diff_dir(device: str) -> str:
     return os.path.join(device_root(SNAPDIR, device), "diffs")
 
 
-def list_diffs(device: str, vrf: Optional[str], afi: Optional[str]) -> List[Dict[str, Any]]:
+def list_diffs(device: str, vrf: Optional[str], afi: Optional[str],
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Return a list of diff metadata entries like:
     [{"vrf":"default","afi":"ipv4","ts":"20250811031450","name":"default.ipv4.20250811031450.json.gz","size":1234}, ...]
-    Filterable by vrf/afi if provided.
+    Filterable by vrf/afi if provided. Newest first, at most limit entries.
     """
+    index = read_index(device)
+    if index is not None:
+        found = [rec for rec in index if rec["table"] == "diff"
+                 and (not vrf or rec["vrf"] == vrf) and (not afi or rec["afi"] == afi)]
+        if limit is None:
+            found.sort(key=itemgetter("ts"), reverse=True)
+        else:
+            found = heapq.nlargest(limit, found, key=itemgetter("ts"))
+        return [{k: rec[k] for k in ("vrf", "afi", "ts", "name", "size")} for rec in found]
     dd = diff_dir(device)
     if not _exists(dd):
         return []
-    entries = []
-    pat = re.compile(r"^(?P<vrf>[^.]+)\.(?P<afi>ipv4|ipv6)\.(?P<ts>\d{14})\.json\.gz$")
-    for name in _list_files(dd, pat):
+    found = []
+    pat = _DIFF_FILE_PAT
+    for entry in _list_files(dd, pat):
+        name = entry.name
         m = pat.match(name)
         if not m:
             continue
         v = m.group("vrf")
         a = m.group("afi")
-        ts = m.group("ts")
         if vrf and v != vrf:
             continue
         if afi and a != afi:
             continue
-        fp = os.path.join(dd, name)
-        try:
-            size = os.path.getsize(fp)
-        except Exception:
-            size = 0
-        entries.append({"vrf": v, "afi": a, "ts": ts, "name": name, "size": size})
-    # sort newest first
-    entries.sort(key=lambda e: e["ts"], reverse=True)
-    return entries
+        found.append((m.group("ts"), v, a, entry))
+    # sort newest first; stat only the entries returned
+    if limit is None:
+        found.sort(key=itemgetter(0), reverse=True)
+    else:
+        found = heapq.nlargest(limit, found, key=itemgetter(0))
+    return [{"vrf": v, "afi": a, "ts": ts, "name": e.name, "size": _entry_size(e)}
+            for ts, v, a, e in found]
 
 
 @app.get("/api/health")
@@ -127,30 +287,27 @@ def api_devices():
 
 @app.get("/api/devices/{device}/tables")
 def api_device_tables(device: str):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
     return scan_tables_for_device(device)
 
 
 @app.get("/api/devices/{device}/latest")
 def api_latest(
+    request: Request,
     device: str,
     table: str = Query(..., pattern="^(rib|bgp)$"),
     vrf: str = Query(...),
     afi: str = Query(..., pattern="^(ipv4|ipv6)$"),
 ):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
     if table not in ("rib", "bgp"):
         raise HTTPException(status_code=400, detail="Invalid table")
     lp = latest_path(SNAPDIR, device, table, vrf, afi)
     if not _exists(lp):
         raise HTTPException(status_code=404, detail="Latest snapshot not found")
-    try:
-        data = read_json(lp)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read latest: {e}")
-    return JSONResponse(content=data)
+    return json_file_response(request, lp, "latest")
 
 
 @app.get("/api/devices/{device}/history")
@@ -161,48 +318,42 @@ def api_history(
     afi: str = Query(..., pattern="^(ipv4|ipv6)$"),
     limit: int = Query(20, ge=1, le=500),
 ):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
+    index = read_index(device)
+    if index is not None:
+        found = [rec for rec in index if rec["table"] == table and rec["vrf"] == vrf and rec["afi"] == afi]
+        newest = heapq.nlargest(limit, found, key=itemgetter("ts"))
+        return {"items": [{"ts": rec["ts"], "name": rec["name"], "size": rec["size"]} for rec in newest]}
     td = table_dir(SNAPDIR, device, table)
     if not _exists(td):
         return {"items": []}
-    pat = re.compile(rf"^{re.escape(vrf)}\.{re.escape(afi)}\.(\d{{14}})\.json\.gz$")
-    items = []
-    for name in _list_files(td):
-        m = pat.match(name)
-        if not m:
-            continue
-        ts = m.group(1)
-        fp = os.path.join(td, name)
-        try:
-            size = os.path.getsize(fp)
-        except Exception:
-            size = 0
-        items.append({"ts": ts, "name": name, "size": size})
-    items.sort(key=lambda e: e["ts"], reverse=True)
-    return {"items": items[:limit]}
+    pat = _history_pat(vrf, afi)
+    # Pick the newest `limit` by name first; only those are stat()ed for their size
+    found = ((pat.match(e.name).group(1), e) for e in _list_files(td, pat))
+    newest = heapq.nlargest(limit, found, key=itemgetter(0))
+    return {"items": [{"ts": ts, "name": e.name, "size": _entry_size(e)} for ts, e in newest]}
 
 
 @app.get("/api/devices/{device}/history/{ts}")
 def api_history_item(
+    request: Request,
     device: str,
     ts: str,
     table: str = Query(..., pattern="^(rib|bgp)$"),
     vrf: str = Query(...),
     afi: str = Query(..., pattern="^(ipv4|ipv6)$"),
 ):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
     td = table_dir(SNAPDIR, device, table)
-    fname = f"{vrf}.{afi}.{ts}.json.gz"
-    fp = os.path.join(td, fname)
-    if not _exists(fp):
+    for ext in ("gz", "zst"):
+        fp = os.path.join(td, f"{vrf}.{afi}.{ts}.json.{ext}")
+        if _exists(fp):
+            break
+    else:
         raise HTTPException(status_code=404, detail="Archive not found")
-    try:
-        data = read_json(fp)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read archive: {e}")
-    return JSONResponse(content=data)
+    return archive_response(request, fp, "archive")
 
 
 @app.get("/api/devices/{device}/diffs")
@@ -212,34 +363,36 @@ def api_diffs_index(
     afi: Optional[str] = Query(None, pattern="^(ipv4|ipv6)$"),
     limit: int = Query(50, ge=1, le=1000),
 ):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
-    items = list_diffs(device, vrf, afi)
-    return {"items": items[:limit]}
+    return {"items": list_diffs(device, vrf, afi, limit)}
 
 
 @app.get("/api/devices/{device}/diffs/{ts}")
 def api_diff_item(
+    request: Request,
     device: str,
     ts: str,
     vrf: str = Query(...),
     afi: str = Query(..., pattern="^(ipv4|ipv6)$"),
 ):
-    if device not in list_devices():
+    if device not in _device_set():
         raise HTTPException(status_code=404, detail="Device not found")
     dd = diff_dir(device)
     fname = f"{vrf}.{afi}.{ts}.json.gz"
     fp = os.path.join(dd, fname)
     if not _exists(fp):
         raise HTTPException(status_code=404, detail="Diff not found")
-    try:
-        data = read_json(fp)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read diff: {e}")
-    return JSONResponse(content=data)
+    return archive_response(request, fp, "diff")
 
 
 # Serve static frontend (built assets in ./webui)
 # Note: /api/* routes are handled above; all other paths serve index.html
 if _exists("webui"):
-    app.mount("/", StaticFiles(directory="webui", html=True), name="webui")
+    mount_cached_static(app, "webui")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("webui:app", host="0.0.0.0", port=5000, loop="uvloop", http="httptools",
+                workers=int(os.environ.get("WEB_WORKERS") or os.cpu_count() or 1))
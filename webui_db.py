@@ -3,16 +3,30 @@ FastAPI server for web UI with database backend.
 """
 
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from itertools import islice
+
+import anyio.to_thread
+import orjson
 
-from database import get_session
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy.orm import Session
+
+from database import DB_MAX_OVERFLOW, DB_POOL_SIZE, get_engine, get_session
+from orjson_response import OrjsonResponse
+from static_cache import mount_cached_static
 from device_manager import DeviceManager
 from storage_db import DatabaseStorage
 
@@ -39,7 +53,100 @@ class DeviceUpdate(BaseModel):
     enabled: Optional[bool] = None
     use_nxapi: Optional[bool] = None
 
-app = FastAPI(title=APP_TITLE)
+class DeviceResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    hostname: str
+    device_type: str
+    username: str
+    port: int
+    enabled: bool
+    use_nxapi: bool
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+# Threads running the sync endpoints; by default one per pooled connection, so a
+# burst queues in the event loop rather than in threads blocked on the pool
+WEB_THREADS = int(os.getenv("WEB_THREADS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared engine and its connection pool before the first request."""
+    app.state.engine = get_engine()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WEB_THREADS
+    yield
+
+
+def get_db():
+    """Per-request pooled session; shared by every dependency of the same request."""
+    session = get_session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_storage(db: Session = Depends(get_db)) -> DatabaseStorage:
+    return DatabaseStorage(db)
+
+
+def get_manager(db: Session = Depends(get_db)) -> DeviceManager:
+    return DeviceManager(db)
+
+
+@lru_cache(maxsize=1024)
+def _parse_ts(timestamp: str) -> datetime:
+    """
+    Parse an ISO-8601 timestamp from a URL. The UI re-requests the same few, so
+    results are cached. A trailing "Z" is rewritten: fromisoformat only accepts it from 3.11.
+    """
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return datetime.fromisoformat(timestamp)
+
+
+# Seconds the read endpoints polled by every UI refresh reuse their last result.
+# The cache is per worker process: device writes clear only the handling worker's
+# copy, so with several uvicorn workers a change can take up to a TTL to show up
+# everywhere. Keep these short; the device endpoints themselves are not cached.
+TABLES_CACHE_TTL = 10
+STATUS_CACHE_TTL = 5
+# Most entries kept; least recently used ones are evicted first
+API_CACHE_SIZE = 256
+
+_api_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_api_cache_lock = threading.Lock()
+
+
+def _cached(key: tuple, ttl: float, compute):
+    """
+    compute() memoized under key for ttl seconds; cached values must not be mutated.
+    A None result is returned but not stored.
+    """
+    now = time.monotonic()
+    with _api_cache_lock:
+        hit = _api_cache.get(key)
+        if hit is not None and hit[0] > now:
+            _api_cache.move_to_end(key)
+            return hit[1]
+    value = compute()
+    if value is not None:
+        with _api_cache_lock:
+            _api_cache[key] = (now + ttl, value)
+            _api_cache.move_to_end(key)
+            if len(_api_cache) > API_CACHE_SIZE:
+                _api_cache.popitem(last=False)
+    return value
+
+
+def _invalidate_api_cache():
+    with _api_cache_lock:
+        _api_cache.clear()
+
+
+app = FastAPI(title=APP_TITLE, lifespan=lifespan, default_response_class=OrjsonResponse)
 
 # Add CORS middleware for web UI
 app.add_middleware(
@@ -50,36 +157,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route tables and diffs are repetitive JSON; compress anything past a packet or so
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
-@app.get("/api/devices")
-def list_devices(all_devices: bool = Query(False, description="Include disabled devices")):
+
+@app.get("/api/devices", response_model=List[DeviceResponse])
+def list_devices(
+    all_devices: bool = Query(False, description="Include disabled devices"),
+    manager: DeviceManager = Depends(get_manager)
+):
     """List all devices."""
-    manager = DeviceManager()
-    try:
-        devices = manager.get_all_devices(enabled_only=not all_devices)
-        return [
-            {
-                "id": d.id,
-                "name": d.name,
-                "hostname": d.hostname,
-                "device_type": d.device_type,
-                "username": d.username,
-                "port": d.port,
-                "enabled": d.enabled,
-                "use_nxapi": d.use_nxapi,
-                "created_at": d.created_at.isoformat() if d.created_at else None,
-                "updated_at": d.updated_at.isoformat() if d.updated_at else None,
-            }
-            for d in devices
-        ]
-    finally:
-        manager.close()
+    return manager.get_device_summaries(enabled_only=not all_devices)
 
 
-@app.post("/api/devices")
-def create_device(device: DeviceCreate):
+@app.post("/api/devices", response_model=DeviceResponse)
+def create_device(device: DeviceCreate, manager: DeviceManager = Depends(get_manager)):
     """Create a new device."""
-    manager = DeviceManager()
     try:
         new_device = manager.add_device(
             name=device.name,
@@ -91,138 +184,157 @@ def create_device(device: DeviceCreate):
             enabled=device.enabled,
             use_nxapi=device.use_nxapi,
         )
-        return {
-            "id": new_device.id,
-            "name": new_device.name,
-            "hostname": new_device.hostname,
-            "device_type": new_device.device_type,
-            "username": new_device.username,
-            "port": new_device.port,
-            "enabled": new_device.enabled,
-            "use_nxapi": new_device.use_nxapi,
-            "created_at": new_device.created_at.isoformat() if new_device.created_at else None,
-        }
+        _invalidate_api_cache()
+        return new_device
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        manager.close()
 
 
-@app.get("/api/devices/{device_name}")
-def get_device(device_name: str):
+@app.get("/api/devices/{device_name}", response_model=DeviceResponse)
+def get_device(device_name: str, manager: DeviceManager = Depends(get_manager)):
     """Get a specific device by name."""
-    manager = DeviceManager()
-    try:
-        device = manager.get_device(device_name)
-        if device is None:
-            raise HTTPException(status_code=404, detail="Device not found")
-        return {
-            "id": device.id,
-            "name": device.name,
-            "hostname": device.hostname,
-            "device_type": device.device_type,
-            "username": device.username,
-            "port": device.port,
-            "enabled": device.enabled,
-            "use_nxapi": device.use_nxapi,
-            "created_at": device.created_at.isoformat() if device.created_at else None,
-            "updated_at": device.updated_at.isoformat() if device.updated_at else None,
-        }
-    finally:
-        manager.close()
+    device = manager.get_device(name=device_name)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
 
 
-@app.put("/api/devices/{device_name}")
-def update_device(device_name: str, device: DeviceUpdate):
+@app.put("/api/devices/{device_name}", response_model=DeviceResponse)
+def update_device(device_name: str, device: DeviceUpdate, manager: DeviceManager = Depends(get_manager)):
     """Update an existing device."""
-    manager = DeviceManager()
     try:
         # Get existing device
-        existing = manager.get_device(device_name)
+        existing = manager.get_device(name=device_name)
         if existing is None:
             raise HTTPException(status_code=404, detail="Device not found")
         
         # Update only provided fields
         update_data = device.dict(exclude_unset=True)
         updated_device = manager.update_device(device_name, **update_data)
-        
-        return {
-            "id": updated_device.id,
-            "name": updated_device.name,
-            "hostname": updated_device.hostname,
-            "device_type": updated_device.device_type,
-            "username": updated_device.username,
-            "port": updated_device.port,
-            "enabled": updated_device.enabled,
-            "use_nxapi": updated_device.use_nxapi,
-            "updated_at": updated_device.updated_at.isoformat() if updated_device.updated_at else None,
-        }
+        _invalidate_api_cache()
+        return updated_device
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        manager.close()
 
 
 @app.delete("/api/devices/{device_name}")
-def delete_device(device_name: str):
+def delete_device(device_name: str, manager: DeviceManager = Depends(get_manager)):
     """Delete a device."""
-    manager = DeviceManager()
-    try:
-        success = manager.delete_device(device_name)
-        if not success:
-            raise HTTPException(status_code=404, detail="Device not found")
-        return {"message": f"Device {device_name} deleted successfully"}
-    finally:
-        manager.close()
+    success = manager.delete_device(device_name)
+    _invalidate_api_cache()
+    if not success:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return {"message": f"Device {device_name} deleted successfully"}
 
 
 @app.get("/api/devices/{device}/tables")
-def get_device_tables(device: str):
+def get_device_tables(device: str, storage: DatabaseStorage = Depends(get_storage)):
     """Get available VRF/AFI combinations for a device."""
-    storage = DatabaseStorage()
-    try:
-        tables = storage.get_available_tables(device)
-        result = {"rib": [], "bgp": []}
-        
-        for table_type, vrf, afi in tables:
-            entry = {"vrf": vrf, "afi": afi}
-            if table_type == "rib" and entry not in result["rib"]:
-                result["rib"].append(entry)
-            elif table_type == "bgp" and entry not in result["bgp"]:
-                result["bgp"].append(entry)
-        
-        return result
-    finally:
-        storage.close()
+    return _cached(("tables", device), TABLES_CACHE_TTL,
+                   lambda: _device_tables(storage, device)) or {"rib": [], "bgp": []}
+
+
+def _device_tables(storage: DatabaseStorage, device: str) -> Optional[Dict[str, List[Dict[str, str]]]]:
+    """None for an unknown device or one with no snapshots, so nothing is cached for it."""
+    # get_available_tables() is SELECT DISTINCT per table type, so rows are unique
+    pairs = {"rib": [], "bgp": []}
+    for table_type, vrf, afi in storage.get_available_tables(device):
+        if table_type in pairs:
+            pairs[table_type].append((vrf, afi))
+    if not any(pairs.values()):
+        return None
+
+    return {
+        table_type: [{"vrf": vrf, "afi": afi} for vrf, afi in sorted(found)]
+        for table_type, found in pairs.items()
+    }
 
 
 @app.get("/api/devices/{device}/latest")
 def get_latest_snapshot(
+    request: Request,
     device: str,
     table: str = Query(..., description="Table type: 'rib' or 'bgp'"),
     vrf: str = Query(..., description="VRF name"),
-    afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'")
+    afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'"),
+    storage: DatabaseStorage = Depends(get_storage)
 ):
     """Get the latest snapshot for a device/table/vrf/afi."""
-    storage = DatabaseStorage()
-    try:
-        data = storage.get_latest_snapshot(device, table, vrf, afi)
-        if data is None:
-            raise HTTPException(status_code=404, detail="No snapshot found")
-        
-        # Convert dict to list for API consistency
-        routes = list(data.values()) if isinstance(data, dict) else data
-        
-        return {
-            "device": device,
-            "table": table,
-            "vrf": vrf,
-            "afi": afi,
-            "routes": routes,
-            "count": len(routes)
-        }
-    finally:
-        storage.close()
+    meta = storage.get_snapshot_meta(device, table, vrf, afi)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="No snapshot found")
+
+    head = {"device": device, "table": table, "vrf": vrf, "afi": afi}
+    # A newer snapshot changes the ETag, so clients must revalidate
+    return _snapshot_response(request, storage, table, meta, head, "no-cache")
+
+
+def _snapshot_response(request: Request, storage: DatabaseStorage, table: str,
+                       meta: Tuple[int, datetime], head: Dict[str, Any], cache_control: str):
+    """
+    Stream the snapshot identified by meta (see get_snapshot_meta), tagged with an ETag
+    built from its id and timestamp. A matching If-None-Match gets a 304 and the
+    snapshot data is never loaded.
+    """
+    snapshot_id, ts = meta
+    headers = {"ETag": f'W/"{table}-{snapshot_id}-{ts:%Y%m%d%H%M%S}"', "Cache-Control": cache_control}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    data = _single_flight((table, snapshot_id), lambda: storage.get_snapshot_by_id(table, snapshot_id))
+    if data is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    # Stream the routes rather than building a list and one big JSON blob
+    routes = data.values() if isinstance(data, dict) else data
+    return StreamingResponse(_stream_routes(head, routes), media_type="application/json", headers=headers)
+
+
+# Snapshot loads in progress, so concurrent requests for one snapshot share a query
+_inflight: Dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _single_flight(key: tuple, load):
+    """
+    Return load(), running it once for all callers that ask for key at the same
+    time; later callers wait for the first one's result (or exception).
+    """
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+    if leader:
+        try:
+            fut.set_result(load())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+    return fut.result()
+
+
+# Routes encoded per orjson call when streaming a snapshot
+STREAM_BATCH = 1000
+
+
+def _stream_routes(head: Dict[str, Any], routes):
+    """
+    Yield {**head, "routes": [...], "count": N} as JSON bytes, a batch of routes at a time.
+    """
+    yield orjson.dumps(head)[:-1] + b',"routes":['
+    it = iter(routes)
+    count = 0
+    while True:
+        batch = list(islice(it, STREAM_BATCH))
+        if not batch:
+            break
+        # Strip the enclosing [ ] so batches join into one array
+        yield (b"," if count else b"") + orjson.dumps(batch)[1:-1]
+        count += len(batch)
+    yield b'],"count":' + str(count).encode() + b"}"
 
 
 @app.get("/api/devices/{device}/diffs")
@@ -231,31 +343,31 @@ def get_diffs(
     vrf: str = Query(..., description="VRF name"),
     afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'"),
     table: Optional[str] = Query(None, description="Table type: 'rib' or 'bgp'"),
-    limit: int = Query(20, description="Maximum number of diffs to return")
+    limit: int = Query(20, description="Maximum number of diffs to return"),
+    before: Optional[str] = Query(None, description="Page cursor timestamp (from the previous page's 'next')"),
+    before_id: Optional[int] = Query(None, description="Page cursor diff id (from the previous page's 'next')"),
+    storage: DatabaseStorage = Depends(get_storage)
 ):
     """Get recent diffs for a device/vrf/afi."""
-    storage = DatabaseStorage()
-    try:
-        diffs = storage.get_diffs(device, vrf, afi, table, limit)
-        
-        # Format for API
-        result = []
-        for diff in diffs:
-            result.append({
-                "timestamp": diff["timestamp"],
-                "table_type": diff["table_type"],
-                "vrf": diff["vrf"],
-                "afi": diff["afi"],
-                "summary": {
-                    "added": len(diff.get("added", [])),
-                    "removed": len(diff.get("removed", [])),
-                    "changed": len(diff.get("changed", []))
-                }
-            })
-        
-        return result
-    finally:
-        storage.close()
+    diffs = storage.get_diff_summaries(device, vrf, afi, table, limit, before and _parse_ts(before), before_id)
+
+    # Format for API
+    result = []
+    for diff in diffs:
+        result.append({
+            "id": diff["id"],
+            "timestamp": diff["timestamp"],
+            "table_type": diff["table_type"],
+            "vrf": diff["vrf"],
+            "afi": diff["afi"],
+            "summary": {
+                "added": diff["added"],
+                "removed": diff["removed"],
+                "changed": diff["changed"]
+            }
+        })
+
+    return _page(result, limit, lambda d: {"before": d["timestamp"], "before_id": d["id"]})
 
 
 @app.get("/api/devices/{device}/diffs/{timestamp}")
@@ -264,21 +376,17 @@ def get_diff_detail(
     timestamp: str,
     vrf: str = Query(..., description="VRF name"),
     afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'"),
-    table: str = Query(..., description="Table type: 'rib' or 'bgp'")
+    table: str = Query(..., description="Table type: 'rib' or 'bgp'"),
+    storage: DatabaseStorage = Depends(get_storage)
 ):
     """Get detailed diff for a specific timestamp."""
-    storage = DatabaseStorage()
-    try:
-        # Parse timestamp
-        ts = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-        
-        diff = storage.get_diff_at_time(device, table, vrf, afi, ts)
-        if diff is None:
-            raise HTTPException(status_code=404, detail="Diff not found")
-        
-        return diff
-    finally:
-        storage.close()
+    ts = _parse_ts(timestamp)
+
+    diff = storage.get_diff_at_time(device, table, vrf, afi, ts)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Diff not found")
+
+    return diff
 
 
 @app.get("/api/devices/{device}/history")
@@ -287,110 +395,93 @@ def get_history(
     table: str = Query(..., description="Table type: 'rib' or 'bgp'"),
     vrf: str = Query(..., description="VRF name"),
     afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'"),
-    limit: int = Query(100, description="Maximum number of snapshots")
+    limit: int = Query(100, description="Maximum number of snapshots"),
+    before: Optional[str] = Query(None, description="Page cursor timestamp (from the previous page's 'next')"),
+    storage: DatabaseStorage = Depends(get_storage)
 ):
     """Get historical snapshot timestamps."""
-    storage = DatabaseStorage()
-    try:
-        timestamps = storage.list_snapshots(device, table, vrf, afi, limit)
-        
-        return [
-            {
-                "timestamp": ts.isoformat(),
-                "table": table,
-                "vrf": vrf,
-                "afi": afi
-            }
-            for ts in timestamps
-        ]
-    finally:
-        storage.close()
+    timestamps = storage.list_snapshots(device, table, vrf, afi, limit, before and _parse_ts(before))
+
+    return _page([
+        {
+            "timestamp": ts.isoformat(),
+            "table": table,
+            "vrf": vrf,
+            "afi": afi
+        }
+        for ts in timestamps
+    ], limit, lambda s: {"before": s["timestamp"]})
+
+
+def _page(items: List[Dict[str, Any]], limit: int, cursor) -> Dict[str, Any]:
+    """
+    One page of newest-first items. "next" holds the query parameters that
+    fetch the following page (cursor applied to the last item), or None.
+    """
+    more = items and len(items) == limit
+    return {"items": items, "next": cursor(items[-1]) if more else None}
 
 
 @app.get("/api/devices/{device}/snapshot/{timestamp}")
 def get_snapshot_at_time(
+    request: Request,
     device: str,
     timestamp: str,
     table: str = Query(..., description="Table type: 'rib' or 'bgp'"),
     vrf: str = Query(..., description="VRF name"),
-    afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'")
+    afi: str = Query(..., description="Address family: 'ipv4' or 'ipv6'"),
+    storage: DatabaseStorage = Depends(get_storage)
 ):
     """Get a specific historical snapshot."""
-    storage = DatabaseStorage()
-    try:
-        # Parse timestamp
-        ts = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-        
-        data = storage.get_snapshot_at_time(device, table, vrf, afi, ts)
-        if data is None:
-            raise HTTPException(status_code=404, detail="Snapshot not found")
-        
-        # Convert dict to list for API consistency
-        routes = list(data.values()) if isinstance(data, dict) else data
-        
-        return {
-            "device": device,
-            "table": table,
-            "vrf": vrf,
-            "afi": afi,
-            "timestamp": timestamp,
-            "routes": routes,
-            "count": len(routes)
-        }
-    finally:
-        storage.close()
+    ts = _parse_ts(timestamp)
+
+    meta = storage.get_snapshot_meta(device, table, vrf, afi, ts)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    head = {"device": device, "table": table, "vrf": vrf, "afi": afi, "timestamp": timestamp}
+    # Stored snapshots never change
+    return _snapshot_response(request, storage, table, meta, head, "public, max-age=31536000, immutable")
 
 
 @app.get("/api/status")
-def get_status():
+def get_status(
+    storage: DatabaseStorage = Depends(get_storage),
+    manager: DeviceManager = Depends(get_manager)
+):
     """Get system status and statistics."""
-    storage = DatabaseStorage()
-    manager = DeviceManager()
-    try:
-        devices = manager.get_all_devices(enabled_only=True)
-        
-        stats = {
-            "devices": len(devices),
-            "snapshots": {
-                "rib": 0,
-                "bgp": 0
-            },
-            "latest_collections": {}
-        }
-        
-        # Get snapshot counts and latest collection times
-        for device in devices:
-            # Get latest RIB snapshot time
-            rib_times = storage.list_snapshots(device.name, "rib", "default", "ipv4", 1)
-            bgp_times = storage.list_snapshots(device.name, "bgp", "default", "ipv4", 1)
-            
-            if rib_times:
-                stats["snapshots"]["rib"] += 1
-                latest_time = rib_times[0]
-                if device.name not in stats["latest_collections"]:
-                    stats["latest_collections"][device.name] = latest_time.isoformat()
-                
-            if bgp_times:
-                stats["snapshots"]["bgp"] += 1
-        
-        return stats
-    finally:
-        storage.close()
-        manager.close()
+    return _cached(("status",), STATUS_CACHE_TTL, lambda: _status(storage, manager))
+
+
+def _status(storage: DatabaseStorage, manager: DeviceManager) -> Dict[str, Any]:
+    stats = {
+        "devices": manager.count_devices(enabled_only=True),
+        "snapshots": {
+            "rib": 0,
+            "bgp": 0
+        },
+        "latest_collections": {}
+    }
+
+    # Get snapshot counts and latest collection times (one query for all devices)
+    latest = storage.get_latest_collection_times("default", "ipv4", enabled_only=True)
+    for name, times in latest.items():
+        if "rib" in times:
+            stats["snapshots"]["rib"] += 1
+            stats["latest_collections"][name] = times["rib"].isoformat()
+        if "bgp" in times:
+            stats["snapshots"]["bgp"] += 1
+
+    return stats
 
 
 # Device management endpoints
 @app.post("/api/admin/devices")
-def create_device(device_data: Dict[str, Any]):
+def create_device_admin(device_data: DeviceCreate, manager: DeviceManager = Depends(get_manager)):
     """Create a new device."""
-    manager = DeviceManager()
     try:
-        required = ["name", "hostname", "device_type", "username", "password"]
-        for field in required:
-            if field not in device_data:
-                raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
-        
-        device = manager.create_device(**device_data)
+        device = manager.create_device(**device_data.dict())
+        _invalidate_api_cache()
         return {
             "id": device.id,
             "name": device.name,
@@ -399,16 +490,14 @@ def create_device(device_data: Dict[str, Any]):
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        manager.close()
 
 
 @app.put("/api/admin/devices/{device_id}")
-def update_device(device_id: int, device_data: Dict[str, Any]):
+def update_device_admin(device_id: int, device_data: DeviceUpdate, manager: DeviceManager = Depends(get_manager)):
     """Update a device."""
-    manager = DeviceManager()
     try:
-        device = manager.update_device(device_id, **device_data)
+        device = manager.update_device(device_id, **device_data.dict(exclude_unset=True))
+        _invalidate_api_cache()
         if device is None:
             raise HTTPException(status_code=404, detail="Device not found")
         
@@ -419,57 +508,48 @@ def update_device(device_id: int, device_data: Dict[str, Any]):
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        manager.close()
 
 
 @app.delete("/api/admin/devices/{device_id}")
-def delete_device(device_id: int):
+def delete_device_admin(device_id: int, manager: DeviceManager = Depends(get_manager)):
     """Delete a device and all its data."""
-    manager = DeviceManager()
-    try:
-        success = manager.delete_device(device_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        return {"deleted": True}
-    finally:
-        manager.close()
+    success = manager.delete_device(device_id)
+    _invalidate_api_cache()
+    if not success:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    return {"deleted": True}
 
 
 @app.post("/api/admin/devices/{device_id}/enable")
-def enable_device(device_id: int):
+def enable_device(device_id: int, manager: DeviceManager = Depends(get_manager)):
     """Enable a device for monitoring."""
-    manager = DeviceManager()
-    try:
-        success = manager.enable_device(device_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        return {"enabled": True}
-    finally:
-        manager.close()
+    success = manager.enable_device(device_id)
+    _invalidate_api_cache()
+    if not success:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    return {"enabled": True}
 
 
 @app.post("/api/admin/devices/{device_id}/disable")
-def disable_device(device_id: int):
+def disable_device(device_id: int, manager: DeviceManager = Depends(get_manager)):
     """Disable a device from monitoring."""
-    manager = DeviceManager()
-    try:
-        success = manager.disable_device(device_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        return {"disabled": True}
-    finally:
-        manager.close()
+    success = manager.disable_device(device_id)
+    _invalidate_api_cache()
+    if not success:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    return {"disabled": True}
 
 
 # Serve static files for web UI
 if os.path.exists("webui"):
-    app.mount("/", StaticFiles(directory="webui", html=True), name="static")
+    mount_cached_static(app, "webui")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    # Each worker process builds its own engine in lifespan()
+    uvicorn.run("webui_db:app", host="0.0.0.0", port=5000, loop="uvloop", http="httptools",
+                workers=int(os.environ.get("WEB_WORKERS") or os.cpu_count() or 1))
\ No newline at end of file